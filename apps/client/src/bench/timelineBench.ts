@@ -0,0 +1,150 @@
+// Timeline rendering benchmark: streams synthetic events into EventTimeline through the
+// same frame-batched ring buffer the WebSocket uses, and samples FPS, frame times, JS
+// heap and mounted row count once per second.
+//
+// Usage (client dev server running): open
+//   http://localhost:5173/timeline-bench.html?events=50000&rate=200&capacity=50000
+// Results are shown in the corner, logged with console.table when the run ends, and
+// left on window.__timelineBench for scripted runs. Heap figures need Chromium.
+
+import { createApp, defineComponent, h, ref } from 'vue';
+import '../styles/main.css';
+import '../styles/themes.css';
+import EventTimeline from '../components/EventTimeline.vue';
+import { useEventBuffer } from '../composables/useEventBuffer';
+import type { HookEvent } from '../types';
+
+const params = new URLSearchParams(location.search);
+const totalEvents = parseInt(params.get('events') || '50000');
+const rate = parseInt(params.get('rate') || '200'); // events/sec
+const capacity = parseInt(params.get('capacity') || String(totalEvents));
+const tickMs = 50;
+
+interface Sample {
+  second: number;
+  buffered: number;
+  fps: number;
+  p95FrameMs: number;
+  maxFrameMs: number;
+  heapMB: number | null;
+  mountedRows: number;
+}
+
+const tools = ['Bash', 'Read', 'Write', 'Edit', 'Grep', 'Glob'];
+const eventTypes = ['PreToolUse', 'PostToolUse', 'UserPromptSubmit', 'Notification', 'Stop'];
+
+function makeEvent(i: number): HookEvent {
+  const tool = tools[i % tools.length];
+  return {
+    id: i + 1,
+    source_app: `bench-app-${i % 4}`,
+    session_id: `bench-session-${i % 12}-0000-0000`,
+    hook_event_type: eventTypes[i % eventTypes.length],
+    payload: {
+      tool_name: tool,
+      tool_input: tool === 'Bash'
+        ? { command: `npm run build -- --run ${i}`, description: 'Build the project' }
+        : { file_path: `/repo/src/module-${i % 50}.ts` }
+    },
+    summary: i % 3 === 0 ? `Synthetic event ${i}` : undefined,
+    chat_message_count: i % 7 === 0 ? 12 : undefined,
+    timestamp: Date.now()
+  };
+}
+
+function heapMB(): number | null {
+  const memory = (performance as any).memory;
+  return memory ? Math.round(memory.usedJSHeapSize / 1024 / 1024) : null;
+}
+
+function percentile(sorted: number[], p: number): number {
+  if (sorted.length === 0) return 0;
+  return sorted[Math.min(sorted.length - 1, Math.ceil((p / 100) * sorted.length) - 1)];
+}
+
+const Bench = defineComponent({
+  setup() {
+    const { buffer, version, enqueue } = useEventBuffer(capacity);
+    const stickToBottom = ref(true);
+    const status = ref('starting');
+    const samples: Sample[] = [];
+
+    // Feed events at the target rate
+    let sent = 0;
+    const started = performance.now();
+    const feeder = window.setInterval(() => {
+      const due = Math.min(totalEvents, Math.floor(((performance.now() - started) / 1000) * rate));
+      while (sent < due) {
+        enqueue(makeEvent(sent++));
+      }
+    }, tickMs);
+
+    // Frame timing
+    let frameTimes: number[] = [];
+    let lastFrame = performance.now();
+    let running = true;
+    const onFrame = (now: number) => {
+      frameTimes.push(now - lastFrame);
+      lastFrame = now;
+      if (running) requestAnimationFrame(onFrame);
+    };
+    requestAnimationFrame(onFrame);
+
+    const sampler = window.setInterval(() => {
+      const sorted = [...frameTimes].sort((a, b) => a - b);
+      samples.push({
+        second: samples.length + 1,
+        buffered: buffer.length,
+        fps: frameTimes.length,
+        p95FrameMs: Math.round(percentile(sorted, 95) * 10) / 10,
+        maxFrameMs: Math.round((sorted[sorted.length - 1] || 0) * 10) / 10,
+        heapMB: heapMB(),
+        mountedRows: document.querySelectorAll('[data-seq]').length
+      });
+      frameTimes = [];
+
+      const last = samples[samples.length - 1];
+      status.value = `${sent}/${totalEvents} events · ${last.fps} fps · p95 ${last.p95FrameMs}ms · ` +
+        `heap ${last.heapMB ?? 'n/a'}MB · ${last.mountedRows} rows mounted`;
+
+      if (sent >= totalEvents) {
+        running = false;
+        window.clearInterval(feeder);
+        window.clearInterval(sampler);
+
+        const fps = samples.map(s => s.fps).sort((a, b) => a - b);
+        const summary = {
+          events: totalEvents,
+          rate,
+          capacity,
+          seconds: samples.length,
+          avgFps: Math.round(fps.reduce((a, b) => a + b, 0) / fps.length),
+          p5Fps: percentile(fps, 5),
+          maxFrameMs: Math.max(...samples.map(s => s.maxFrameMs)),
+          heapStartMB: samples[0].heapMB,
+          heapEndMB: last.heapMB,
+          maxMountedRows: Math.max(...samples.map(s => s.mountedRows))
+        };
+        console.table(samples);
+        console.table([summary]);
+        (window as any).__timelineBench = { samples, summary };
+        status.value = `done: ${JSON.stringify(summary)}`;
+      }
+    }, 1000);
+
+    return () => h('div', { class: 'h-screen flex flex-col bg-[var(--theme-bg-secondary)]' }, [
+      h('div', {
+        class: 'fixed top-2 right-2 z-50 px-3 py-2 rounded-lg text-xs font-mono bg-black/80 text-white max-w-xl'
+      }, status.value),
+      h(EventTimeline, {
+        events: buffer,
+        version: version.value,
+        filters: { sourceApp: '', sessionId: '', eventType: '' },
+        stickToBottom: stickToBottom.value,
+        'onUpdate:stickToBottom': (value: boolean) => { stickToBottom.value = value; }
+      })
+    ]);
+  }
+});
+
+createApp(Bench).mount('#app');
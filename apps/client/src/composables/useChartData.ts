@@ -1,5 +1,9 @@
 import { ref, computed } from 'vue';
-import type { HookEvent, ChartDataPoint, TimeRange } from '../types';
+import type { HookEvent, ChartDataPoint, MetricsDelta, MetricsDeltaRow, TimeRange } from '../types';
+import { useMetrics, type MetricsFilters } from './useMetrics';
+
+// How long events are tracked locally (for agent ids and timing metrics)
+export const EVENT_RETENTION_MS = 5 * 60 * 1000;
 
 export function useChartData(agentIdFilter?: string) {
   const timeRange = ref<TimeRange>('1m');
@@ -16,7 +20,7 @@ export function useChartData(agentIdFilter?: string) {
 
   const agentIdParsed = agentIdFilter ? parseAgentId(agentIdFilter) : null;
   
-  // Store all events for re-aggregation when time range changes
+  // Recent events, for agent ids and timing metrics
   const allEvents = ref<HookEvent[]>([]);
   
   // Debounce for high-frequency events
@@ -54,55 +58,94 @@ export function useChartData(agentIdFilter?: string) {
     return Math.floor(timestamp / config.bucketSize) * config.bucketSize;
   };
   
-  const processEventBuffer = () => {
-    const eventsToProcess = [...eventBuffer];
-    eventBuffer = [];
+  // Server-computed series for the current range and filters, keyed by bucket timestamp
+  // so each pushed delta row is applied in O(1). `dataPoints` is the sorted view.
+  const buckets = new Map<number, ChartDataPoint>();
+  let filters: MetricsFilters = agentIdParsed
+    ? { sourceApp: agentIdParsed.app, sessionId: agentIdParsed.session }
+    : {};
+  let seriesSeq: number | null = null; // last applied delta; null until a series is loaded
+  let loading = false;
+  let loadToken = 0;
+  let pendingDeltas: MetricsDelta[] = [];
+  let clearedAt = 0;
+
+  const { onMetricsDelta, onMetricsReset, fetchTimeseries } = useMetrics();
+
+  const matchesFilters = (row: MetricsDeltaRow): boolean => {
+    if (filters.sourceApp && row.source_app !== filters.sourceApp) return false;
+    if (filters.sessionId && !row.session_id.startsWith(filters.sessionId)) return false;
+    if (filters.eventType && row.hook_event_type !== filters.eventType) return false;
+    return true;
+  };
 
-    // Add events to our complete list
-    allEvents.value.push(...eventsToProcess);
+  const applyDelta = (delta: MetricsDelta) => {
+    if (loading) {
+      pendingDeltas.push(delta);
+      return;
+    }
+    if (seriesSeq === null || delta.seq <= seriesSeq) return;
+    if (delta.seq !== seriesSeq + 1) {
+      // Missed a delta (e.g. the stream lagged): start over from a fresh snapshot
+      loadSeries();
+      return;
+    }
+    seriesSeq = delta.seq;
 
-    eventsToProcess.forEach(event => {
-      if (!event.timestamp) return;
+    delta.deltas.forEach(row => {
+      if (row.bucket < clearedAt || !matchesFilters(row)) return;
 
-      // Skip if event doesn't match agent ID filter (check both app and session)
-      if (agentIdParsed) {
-        if (event.source_app !== agentIdParsed.app) {
-          return;
-        }
-        // Check if session ID matches (first 8 chars)
-        if (event.session_id.slice(0, 8) !== agentIdParsed.session) {
-          return;
-        }
+      const bucketTime = getBucketTimestamp(row.bucket);
+      let bucket = buckets.get(bucketTime);
+      if (!bucket) {
+        bucket = { timestamp: bucketTime, count: 0, eventTypes: {}, sessions: {} };
+        buckets.set(bucketTime, bucket);
       }
+      bucket.count += row.count;
+      bucket.eventTypes[row.hook_event_type] = (bucket.eventTypes[row.hook_event_type] || 0) + row.count;
+      bucket.sessions[row.session_id] = (bucket.sessions[row.session_id] || 0) + row.count;
+    });
+
+    cleanOldData();
+  };
 
-      const bucketTime = getBucketTimestamp(event.timestamp);
+  const loadSeries = async () => {
+    const token = ++loadToken;
+    loading = true;
+    pendingDeltas = [];
 
-      // Find existing bucket or create new one
-      let bucket = dataPoints.value.find(dp => dp.timestamp === bucketTime);
-      if (bucket) {
-        bucket.count++;
-        // Track event types
-        if (!bucket.eventTypes) {
-          bucket.eventTypes = {};
-        }
-        bucket.eventTypes[event.hook_event_type] = (bucket.eventTypes[event.hook_event_type] || 0) + 1;
-        // Track sessions
-        if (!bucket.sessions) {
-          bucket.sessions = {};
+    try {
+      const result = await fetchTimeseries(timeRange.value, filters);
+      if (token !== loadToken) return;
+
+      buckets.clear();
+      result.points.forEach(point => {
+        if (point.count > 0 && point.timestamp >= clearedAt) {
+          buckets.set(point.timestamp, point);
         }
-        bucket.sessions[event.session_id] = (bucket.sessions[event.session_id] || 0) + 1;
-      } else {
-        dataPoints.value.push({
-          timestamp: bucketTime,
-          count: 1,
-          eventTypes: { [event.hook_event_type]: 1 },
-          sessions: { [event.session_id]: 1 }
-        });
-      }
-    });
+      });
+      seriesSeq = result.seq;
+    } catch (error) {
+      if (token !== loadToken) return;
+      console.error('Failed to load chart series:', error);
+      seriesSeq = null;
+    }
 
-    // Clean old data once after processing all events
+    loading = false;
+    const queued = pendingDeltas;
+    pendingDeltas = [];
+    queued.forEach(applyDelta);
     cleanOldData();
+  };
+
+  const stopDeltas = onMetricsDelta(applyDelta);
+  const stopResets = onMetricsReset(loadSeries);
+  loadSeries();
+
+  // Events are still tracked locally for agent ids and timing metrics; the bars come from the server
+  const processEventBuffer = () => {
+    allEvents.value.push(...eventBuffer);
+    eventBuffer = [];
     cleanOldEvents();
   };
   
@@ -122,20 +165,22 @@ export function useChartData(agentIdFilter?: string) {
   };
   
   const cleanOldData = () => {
-    const now = Date.now();
-    const cutoffTime = now - currentConfig.value.duration;
+    const cutoffTime = Date.now() - currentConfig.value.duration;
     
-    dataPoints.value = dataPoints.value.filter(dp => dp.timestamp >= cutoffTime);
+    buckets.forEach((_, timestamp) => {
+      if (timestamp < cutoffTime) {
+        buckets.delete(timestamp);
+      }
+    });
     
-    // Ensure we don't exceed max points
-    if (dataPoints.value.length > currentConfig.value.maxPoints) {
-      dataPoints.value = dataPoints.value.slice(-currentConfig.value.maxPoints);
-    }
+    dataPoints.value = Array.from(buckets.values())
+      .sort((a, b) => a.timestamp - b.timestamp)
+      .slice(-currentConfig.value.maxPoints);
   };
   
   const cleanOldEvents = () => {
     const now = Date.now();
-    const cutoffTime = now - 5 * 60 * 1000; // Keep events for max 5 minutes
+    const cutoffTime = now - EVENT_RETENTION_MS;
     
     allEvents.value = allEvents.value.filter(event => 
       event.timestamp && event.timestamp >= cutoffTime
@@ -148,11 +193,11 @@ export function useChartData(agentIdFilter?: string) {
     const startTime = now - config.duration;
     
     // Create array of all time buckets in range
-    const buckets: ChartDataPoint[] = [];
+    const series: ChartDataPoint[] = [];
     for (let time = startTime; time <= now; time += config.bucketSize) {
       const bucketTime = getBucketTimestamp(time);
-      const existingBucket = dataPoints.value.find(dp => dp.timestamp === bucketTime);
-      buckets.push({
+      const existingBucket = buckets.get(bucketTime);
+      series.push({
         timestamp: bucketTime,
         count: existingBucket?.count || 0,
         eventTypes: existingBucket?.eventTypes || {},
@@ -161,59 +206,22 @@ export function useChartData(agentIdFilter?: string) {
     }
     
     // Return only the last maxPoints buckets
-    return buckets.slice(-config.maxPoints);
+    return series.slice(-config.maxPoints);
   };
   
   const setTimeRange = (range: TimeRange) => {
+    if (range === timeRange.value && seriesSeq !== null) return;
     timeRange.value = range;
-    // Re-aggregate data for new bucket size
-    reaggregateData();
+    // Bucket size changed: fetch the series at the new resolution
+    loadSeries();
   };
-  
-  const reaggregateData = () => {
-    // Clear current data points
-    dataPoints.value = [];
-
-    // Re-process all events with new bucket size
-    const now = Date.now();
-    const cutoffTime = now - currentConfig.value.duration;
-
-    // Filter events within the time range and by agent ID if specified
-    let relevantEvents = allEvents.value.filter(event =>
-      event.timestamp && event.timestamp >= cutoffTime
-    );
-
-    if (agentIdParsed) {
-      relevantEvents = relevantEvents.filter(event =>
-        event.source_app === agentIdParsed.app &&
-        event.session_id.slice(0, 8) === agentIdParsed.session
-      );
-    }
 
-    // Re-aggregate all relevant events
-    relevantEvents.forEach(event => {
-      if (!event.timestamp) return;
-
-      const bucketTime = getBucketTimestamp(event.timestamp);
-
-      // Find existing bucket or create new one
-      let bucket = dataPoints.value.find(dp => dp.timestamp === bucketTime);
-      if (bucket) {
-        bucket.count++;
-        bucket.eventTypes[event.hook_event_type] = (bucket.eventTypes[event.hook_event_type] || 0) + 1;
-        bucket.sessions[event.session_id] = (bucket.sessions[event.session_id] || 0) + 1;
-      } else {
-        dataPoints.value.push({
-          timestamp: bucketTime,
-          count: 1,
-          eventTypes: { [event.hook_event_type]: 1 },
-          sessions: { [event.session_id]: 1 }
-        });
-      }
-    });
-
-    // Clean up
-    cleanOldData();
+  // Chart-level filters (LivePulseChart); agent charts are fixed to their agent
+  const setFilters = (next: MetricsFilters) => {
+    filters = agentIdParsed
+      ? { ...next, sourceApp: agentIdParsed.app, sessionId: agentIdParsed.session }
+      : { ...next };
+    loadSeries();
   };
   
   // Auto-clean old data every second
@@ -225,14 +233,19 @@ export function useChartData(agentIdFilter?: string) {
   // Cleanup on unmount
   const cleanup = () => {
     clearInterval(cleanupInterval);
+    stopDeltas();
+    stopResets();
+    loadToken++;
     if (debounceTimer !== null) {
       clearTimeout(debounceTimer);
       processEventBuffer(); // Process any remaining events
     }
   };
 
-  // Clear all data (for when user clicks clear button)
+  // Clear all data (for when user clicks clear button); history before now stays hidden
   const clearData = () => {
+    clearedAt = Date.now();
+    buckets.clear();
     dataPoints.value = [];
     allEvents.value = [];
     eventBuffer = [];
@@ -331,6 +344,7 @@ export function useChartData(agentIdFilter?: string) {
     addEvent,
     getChartData,
     setTimeRange,
+    setFilters,
     cleanup,
     clearData,
     currentConfig,
@@ -0,0 +1,80 @@
+import { ref, shallowRef, markRaw } from 'vue';
+import type { HookEvent } from '../types';
+import { RingBuffer } from '../utils/ringBuffer';
+
+// Flush right away instead of waiting for a frame once this many events are pending
+// (requestAnimationFrame doesn't fire in background tabs)
+const MAX_PENDING = 1000;
+
+/**
+ * Fixed-capacity event store fed one animation frame at a time.
+ *
+ * Incoming events are queued and applied in a single batch per frame, so a burst of
+ * WebSocket messages causes one reactive update instead of one per message. The ring
+ * buffer itself is not reactive; readers watch `version` and use `latestEvents` for
+ * the events added by the most recent flush.
+ */
+export function useEventBuffer(capacity: number) {
+  const buffer = markRaw(new RingBuffer<HookEvent>(capacity));
+  const version = ref(0);
+  const latestEvents = shallowRef<HookEvent[]>([]);
+
+  let pending: HookEvent[] = [];
+  let frame: number | null = null;
+
+  const cancelFrame = () => {
+    if (frame !== null) {
+      cancelAnimationFrame(frame);
+      frame = null;
+    }
+  };
+
+  const flush = () => {
+    cancelFrame();
+    if (pending.length === 0) return;
+
+    const batch = pending;
+    pending = [];
+    batch.forEach(event => buffer.push(event));
+    latestEvents.value = batch;
+    version.value++;
+  };
+
+  const enqueue = (event: HookEvent) => {
+    pending.push(event);
+    if (pending.length >= MAX_PENDING) {
+      flush();
+    } else if (frame === null) {
+      frame = requestAnimationFrame(flush);
+    }
+  };
+
+  // Replace everything, e.g. with the history sent when the stream (re)connects
+  const replace = (events: HookEvent[]) => {
+    cancelFrame();
+    pending = [];
+    buffer.clear();
+    const kept = events.slice(-buffer.capacity);
+    kept.forEach(event => buffer.push(event));
+    latestEvents.value = kept;
+    version.value++;
+  };
+
+  const clear = () => {
+    cancelFrame();
+    pending = [];
+    buffer.clear();
+    latestEvents.value = [];
+    version.value++;
+  };
+
+  return {
+    buffer,
+    version,
+    latestEvents,
+    enqueue,
+    replace,
+    clear,
+    dispose: cancelFrame
+  };
+}
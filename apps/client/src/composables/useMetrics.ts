@@ -0,0 +1,53 @@
+import type { MetricsDelta, TimeRange, TimeseriesResult } from '../types';
+
+export interface MetricsFilters {
+  sourceApp?: string;
+  sessionId?: string; // full id or agent-id prefix
+  eventType?: string;
+}
+
+// Shared between the single /stream connection (useWebSocket) and every chart
+const deltaListeners = new Set<(delta: MetricsDelta) => void>();
+const resetListeners = new Set<() => void>();
+
+// Called by useWebSocket for each `metrics` message
+export function publishMetricsDelta(delta: MetricsDelta) {
+  deltaListeners.forEach(listener => listener(delta));
+}
+
+// Called by useWebSocket once a (re)connected stream is subscribed to metrics;
+// sequence numbers restart with the server, so charts must reload their series
+export function resetMetrics() {
+  resetListeners.forEach(listener => listener());
+}
+
+export function useMetrics() {
+  const onMetricsDelta = (listener: (delta: MetricsDelta) => void): (() => void) => {
+    deltaListeners.add(listener);
+    return () => deltaListeners.delete(listener);
+  };
+
+  const onMetricsReset = (listener: () => void): (() => void) => {
+    resetListeners.add(listener);
+    return () => resetListeners.delete(listener);
+  };
+
+  const fetchTimeseries = async (range: TimeRange, filters: MetricsFilters = {}): Promise<TimeseriesResult> => {
+    const params = new URLSearchParams({ range });
+    if (filters.sourceApp) params.set('source_app', filters.sourceApp);
+    if (filters.sessionId) params.set('session_id', filters.sessionId);
+    if (filters.eventType) params.set('hook_event_type', filters.eventType);
+
+    const response = await fetch(`http://localhost:4000/metrics/timeseries?${params}`);
+    if (!response.ok) {
+      throw new Error(`Failed to load metrics: ${response.status}`);
+    }
+    return response.json();
+  };
+
+  return {
+    onMetricsDelta,
+    onMetricsReset,
+    fetchTimeseries
+  };
+}
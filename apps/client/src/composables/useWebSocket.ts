@@ -1,8 +1,9 @@
-import { ref, onMounted, onUnmounted } from 'vue';
-import type { HookEvent, WebSocketMessage } from '../types';
+import { ref, computed, onMounted, onUnmounted } from 'vue';
+import type { WebSocketMessage } from '../types';
+import { publishMetricsDelta, resetMetrics } from './useMetrics';
+import { useEventBuffer } from './useEventBuffer';
 
 export function useWebSocket(url: string) {
-  const events = ref<HookEvent[]>([]);
   const isConnected = ref(false);
   const error = ref<string | null>(null);
   
@@ -10,7 +11,14 @@ export function useWebSocket(url: string) {
   let reconnectTimeout: number | null = null;
   
   // Get max events from environment variable or use default
-  const maxEvents = parseInt(import.meta.env.VITE_MAX_EVENTS_TO_DISPLAY || '100');
+  const maxEvents = parseInt(import.meta.env.VITE_MAX_EVENTS_TO_DISPLAY || '10000');
+
+  // Ring buffer of the most recent events, updated once per animation frame
+  const { buffer: events, version: eventsVersion, latestEvents: newEvents, enqueue, replace, clear, dispose } = useEventBuffer(maxEvents);
+  const eventCount = computed(() => {
+    eventsVersion.value; // the buffer itself isn't reactive
+    return events.length;
+  });
   
   const connect = () => {
     try {
@@ -20,6 +28,9 @@ export function useWebSocket(url: string) {
         console.log('WebSocket connected');
         isConnected.value = true;
         error.value = null;
+
+        // Opt in to the server-side pulse chart deltas
+        ws?.send(JSON.stringify({ type: 'subscribe', data: { metrics: true } }));
       };
       
       ws.onmessage = (event) => {
@@ -29,16 +40,17 @@ export function useWebSocket(url: string) {
           if (message.type === 'initial') {
             const initialEvents = Array.isArray(message.data) ? message.data : [];
             // Only keep the most recent events up to maxEvents
-            events.value = initialEvents.slice(-maxEvents);
+            replace(initialEvents);
           } else if (message.type === 'event') {
-            const newEvent = message.data as HookEvent;
-            events.value.push(newEvent);
-            
-            // Limit events array to maxEvents, removing the oldest when exceeded
-            if (events.value.length > maxEvents) {
-              // Remove the oldest events (first 10) when limit is exceeded
-              events.value = events.value.slice(events.value.length - maxEvents + 10);
-            }
+            // Batched per animation frame; the oldest events are overwritten once the buffer is full
+            enqueue(message.data);
+          } else if (message.type === 'metrics') {
+            publishMetricsDelta(message.data);
+          } else if (message.type === 'subscribed') {
+            resetMetrics();
+          } else if (message.type === 'lag') {
+            const lag = message.data;
+            console.warn(`Stream lagging: server dropped ${lag.dropped} events (${lag.queued} still queued)`);
           }
         } catch (err) {
           console.error('Failed to parse WebSocket message:', err);
@@ -84,14 +96,18 @@ export function useWebSocket(url: string) {
   
   onUnmounted(() => {
     disconnect();
+    dispose();
   });
 
   const clearEvents = () => {
-    events.value = [];
+    clear();
   };
 
   return {
     events,
+    eventsVersion,
+    eventCount,
+    newEvents,
     isConnected,
     error,
     clearEvents
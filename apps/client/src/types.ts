@@ -23,6 +23,7 @@ export interface HumanInTheLoopStatus {
   status: 'pending' | 'responded' | 'timeout' | 'error';
   respondedAt?: number;
   response?: HumanInTheLoopResponse;
+  error?: string; // Why delivery to the agent failed (status 'error')
 }
 
 export interface HookEvent {
@@ -32,6 +33,7 @@ export interface HookEvent {
   hook_event_type: string;
   payload: Record<string, any>;
   chat?: any[];
+  chat_message_count?: number; // Transcript length; chat may be fetched lazily from /sessions/:id/chat
   summary?: string;
   timestamp?: number;
   model_name?: string;
@@ -47,11 +49,49 @@ export interface FilterOptions {
   hook_event_types: string[];
 }
 
-export interface WebSocketMessage {
-  type: 'initial' | 'event' | 'hitl_response';
-  data: HookEvent | HookEvent[] | HumanInTheLoopResponse;
+export interface StreamLag {
+  dropped: number; // Events the server discarded because this client fell behind
+  queued: number;
 }
 
+// Per-second event counts pushed on /stream since the previous metrics message
+export interface MetricsDeltaRow {
+  bucket: number;
+  source_app: string;
+  session_id: string;
+  hook_event_type: string;
+  count: number;
+}
+
+export interface MetricsDelta {
+  seq: number;
+  deltas: MetricsDeltaRow[];
+}
+
+export interface TimeseriesResult {
+  seq: number; // deltas with a higher seq apply on top of these points
+  resolution: number;
+  points: ChartDataPoint[];
+}
+
+// Echo of the filters the server applied after a subscribe message
+export interface StreamSubscription {
+  source_apps?: string[];
+  session_ids?: string[];
+  hook_event_types?: string[];
+  projection: 'full' | 'summary';
+  metrics?: boolean;
+}
+
+export type WebSocketMessage =
+  | { type: 'initial'; data: HookEvent[] }
+  | { type: 'event'; data: HookEvent }
+  | { type: 'hitl_response'; data: HumanInTheLoopResponse }
+  | { type: 'subscribed'; data: StreamSubscription }
+  | { type: 'lag'; data: StreamLag }
+  | { type: 'error'; data: { error: string } }
+  | { type: 'metrics'; data: MetricsDelta };
+
 export type TimeRange = '1m' | '3m' | '5m' | '10m';
 
 export interface ChartDataPoint {
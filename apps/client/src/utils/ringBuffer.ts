@@ -0,0 +1,64 @@
+// Fixed-capacity FIFO. Pushing past capacity overwrites the oldest item in place, so
+// the backing array is allocated once and never re-sliced. Every pushed item gets a
+// monotonically increasing sequence number, which stays a stable key after eviction.
+export class RingBuffer<T> {
+  readonly capacity: number;
+  private items: (T | undefined)[];
+  private head = 0; // slot of the oldest item
+  private count = 0;
+  private pushed = 0; // total items ever pushed
+
+  constructor(capacity: number) {
+    this.capacity = Math.max(1, Math.floor(capacity));
+    this.items = new Array(this.capacity);
+  }
+
+  get length(): number {
+    return this.count;
+  }
+
+  // Sequence number of the oldest retained item; item i has seq firstSeq + i
+  get firstSeq(): number {
+    return this.pushed - this.count;
+  }
+
+  // Sequence number the next pushed item will get
+  get nextSeq(): number {
+    return this.pushed;
+  }
+
+  push(item: T): void {
+    this.items[(this.head + this.count) % this.capacity] = item;
+    if (this.count < this.capacity) {
+      this.count++;
+    } else {
+      this.head = (this.head + 1) % this.capacity;
+    }
+    this.pushed++;
+  }
+
+  // i = 0 is the oldest retained item
+  at(i: number): T | undefined {
+    if (i < 0 || i >= this.count) return undefined;
+    return this.items[(this.head + i) % this.capacity];
+  }
+
+  atSeq(seq: number): T | undefined {
+    return this.at(seq - this.firstSeq);
+  }
+
+  toArray(): T[] {
+    const result: T[] = new Array(this.count);
+    for (let i = 0; i < this.count; i++) {
+      result[i] = this.items[(this.head + i) % this.capacity] as T;
+    }
+    return result;
+  }
+
+  // Sequence numbers keep counting, so keys handed out before a clear are never reused
+  clear(): void {
+    this.items.fill(undefined);
+    this.head = 0;
+    this.count = 0;
+  }
+}
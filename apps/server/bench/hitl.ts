@@ -0,0 +1,140 @@
+// HITL delivery benchmark: starts local mock agents, files HITL requests against the
+// server, answers them all through POST /events/:id/respond and measures how fast the
+// answers reach the agents. Half the agents ack each delivery, the other half behave
+// like original-protocol agents (read one message, close the socket). A few requests
+// are left unanswered with a short timeout to check that they expire.
+//
+// Usage (server must be running):
+//   bun bench/hitl.ts [--agents 10] [--requests 2000] [--concurrency 50] [--legacy 0.5] [--timeouts 20]
+
+import type { ServerWebSocket } from 'bun';
+
+const args = process.argv.slice(2);
+
+function getArg(name: string, fallback: string): string {
+  const index = args.indexOf(`--${name}`);
+  return index >= 0 && args[index + 1] ? args[index + 1]! : fallback;
+}
+
+const serverUrl = getArg('url', 'http://localhost:4000');
+const agentCount = parseInt(getArg('agents', '10'));
+const totalRequests = parseInt(getArg('requests', '2000'));
+const concurrency = parseInt(getArg('concurrency', '50'));
+const legacyFraction = parseFloat(getArg('legacy', '0.5'));
+const timeoutRequests = parseInt(getArg('timeouts', '20'));
+
+function percentile(sorted: number[], p: number): number {
+  if (sorted.length === 0) return 0;
+  const index = Math.min(sorted.length - 1, Math.ceil((p / 100) * sorted.length) - 1);
+  return sorted[Math.max(0, index)]!;
+}
+
+// event id -> time the answer reached an agent
+const receivedAt = new Map<number, number>();
+let duplicates = 0;
+
+function startAgent(legacy: boolean) {
+  return Bun.serve({
+    port: 0,
+    fetch(req, server) {
+      return server.upgrade(req) ? undefined : new Response('mock agent', { status: 426 });
+    },
+    websocket: {
+      message(ws: ServerWebSocket<unknown>, raw) {
+        const message = JSON.parse(String(raw));
+        const eventId = message.hookEvent?.id as number;
+        if (receivedAt.has(eventId)) {
+          duplicates++;
+        } else {
+          receivedAt.set(eventId, performance.now());
+        }
+
+        if (legacy) {
+          ws.close(1000);
+        } else {
+          ws.send(JSON.stringify({ type: 'ack', deliveryId: message.deliveryId }));
+        }
+      }
+    }
+  });
+}
+
+async function createRequests(urls: string[], count: number, timeoutSeconds: number): Promise<number[]> {
+  const ids: number[] = [];
+  for (let start = 0; start < count; start += 500) {
+    const batch = Array.from({ length: Math.min(500, count - start) }, (_, i) => ({
+      source_app: 'bench-hitl',
+      session_id: `bench-hitl-${(start + i) % agentCount}`,
+      hook_event_type: 'DecisionPoint',
+      payload: { permission_type: 'bench', question: `Request ${start + i}?` },
+      humanInTheLoop: {
+        question: `Request ${start + i}?`,
+        responseWebSocketUrl: urls[(start + i) % urls.length]!,
+        type: 'permission',
+        timeout: timeoutSeconds
+      },
+      timestamp: Date.now()
+    }));
+    const res = await fetch(`${serverUrl}/events/batch`, { method: 'POST', body: JSON.stringify(batch) });
+    const result = await res.json() as { results: { id?: number }[] };
+    ids.push(...result.results.map(r => r.id!).filter(id => id !== undefined));
+  }
+  return ids;
+}
+
+const legacyAgents = Math.round(agentCount * legacyFraction);
+const agents = Array.from({ length: agentCount }, (_, i) => startAgent(i < legacyAgents));
+const agentUrls = agents.map(agent => `ws://localhost:${agent.port}`);
+
+console.log(`HITL benchmark: agents=${agentCount} (legacy=${legacyAgents}) requests=${totalRequests} concurrency=${concurrency}`);
+
+const statsBefore = await (await fetch(`${serverUrl}/hitl/stats`)).json() as any;
+const ids = await createRequests(agentUrls, totalRequests, 300);
+const expiringIds = await createRequests(agentUrls, timeoutRequests, 2);
+
+// Answer every request with `concurrency` responders in parallel
+const respondedAt = new Map<number, number>();
+const httpLatencies: number[] = [];
+let httpFailures = 0;
+let next = 0;
+
+const started = performance.now();
+await Promise.all(Array.from({ length: concurrency }, async () => {
+  while (next < ids.length) {
+    const id = ids[next++]!;
+    const start = performance.now();
+    respondedAt.set(id, start);
+    const res = await fetch(`${serverUrl}/events/${id}/respond`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ permission: true, hookEvent: { id }, respondedAt: Date.now() })
+    });
+    await res.arrayBuffer();
+    if (!res.ok) httpFailures++;
+    httpLatencies.push(performance.now() - start);
+  }
+}));
+const respondedMs = performance.now() - started;
+
+// Wait for deliveries (and the short timeouts) to land
+const deadline = performance.now() + 30_000;
+while (performance.now() < deadline && receivedAt.size < ids.length) {
+  await Bun.sleep(50);
+}
+const deliveredMs = Math.max(...receivedAt.values()) - started;
+await Bun.sleep(3000);
+
+const endToEnd = ids
+  .filter(id => receivedAt.has(id))
+  .map(id => receivedAt.get(id)! - respondedAt.get(id)!)
+  .sort((a, b) => a - b);
+httpLatencies.sort((a, b) => a - b);
+
+const statsAfter = await (await fetch(`${serverUrl}/hitl/stats`)).json() as any;
+
+console.log(`  /respond: ${(ids.length / (respondedMs / 1000)).toFixed(0)} req/s, p50 ${percentile(httpLatencies, 50).toFixed(1)}ms, p99 ${percentile(httpLatencies, 99).toFixed(1)}ms, failures ${httpFailures}`);
+console.log(`  delivered: ${receivedAt.size}/${ids.length} in ${(deliveredMs / 1000).toFixed(2)}s (${(receivedAt.size / (deliveredMs / 1000)).toFixed(0)}/s), duplicates ${duplicates}`);
+console.log(`  end-to-end latency p50: ${percentile(endToEnd, 50).toFixed(1)}ms  p99: ${percentile(endToEnd, 99).toFixed(1)}ms`);
+console.log(`  expired: ${statsAfter.expired - statsBefore.expired}/${expiringIds.length}  retried: ${statsAfter.retried - statsBefore.retried}  failed: ${statsAfter.failed - statsBefore.failed}  pooled connections: ${statsAfter.connections}`);
+
+agents.forEach(agent => agent.stop(true));
@@ -0,0 +1,96 @@
+// Ingest load generator: simulates many agents posting hook events concurrently
+// and reports events/sec plus p50/p99 request latency.
+//
+// Usage (server must be running):
+//   bun bench/ingest.ts [--mode single|batch] [--agents 20] [--events 500] [--batch-size 25]
+//
+// To get the "before" numbers (one transaction per event), start the server with
+//   INGEST_FLUSH_MAX_ROWS=1 INGEST_FLUSH_INTERVAL_MS=0 bun src/index.ts
+// and run with --mode single. Restart the server with the defaults for the "after" numbers.
+
+const args = process.argv.slice(2);
+
+function getArg(name: string, fallback: string): string {
+  const index = args.indexOf(`--${name}`);
+  return index >= 0 && args[index + 1] ? args[index + 1]! : fallback;
+}
+
+const serverUrl = getArg('url', 'http://localhost:4000');
+const mode = getArg('mode', 'single') as 'single' | 'batch';
+const agents = parseInt(getArg('agents', '20'));
+const eventsPerAgent = parseInt(getArg('events', '500'));
+const batchSize = parseInt(getArg('batch-size', '25'));
+
+function makeEvent(agent: number, seq: number) {
+  const isPre = seq % 2 === 0;
+  return {
+    source_app: 'bench-ingest',
+    session_id: `bench-agent-${agent}`,
+    hook_event_type: isPre ? 'PreToolUse' : 'PostToolUse',
+    payload: {
+      tool_name: 'Bash',
+      tool_input: { command: `echo ${seq}` },
+      ...(isPre ? {} : { tool_response: { stdout: `${seq}\n`, stderr: '', interrupted: false } })
+    },
+    timestamp: Date.now()
+  };
+}
+
+function percentile(sorted: number[], p: number): number {
+  if (sorted.length === 0) return 0;
+  const index = Math.min(sorted.length - 1, Math.ceil((p / 100) * sorted.length) - 1);
+  return sorted[Math.max(0, index)]!;
+}
+
+// Latency is recorded per event: a batched event waits as long as its whole request
+const latencies: number[] = [];
+let failures = 0;
+
+async function runSingleAgent(agent: number): Promise<void> {
+  for (let seq = 0; seq < eventsPerAgent; seq++) {
+    const start = performance.now();
+    const res = await fetch(`${serverUrl}/events`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify(makeEvent(agent, seq))
+    });
+    await res.arrayBuffer();
+    if (!res.ok) failures++;
+    latencies.push(performance.now() - start);
+  }
+}
+
+async function runBatchAgent(agent: number): Promise<void> {
+  for (let seq = 0; seq < eventsPerAgent; seq += batchSize) {
+    const count = Math.min(batchSize, eventsPerAgent - seq);
+    const body = Array.from({ length: count }, (_, i) => JSON.stringify(makeEvent(agent, seq + i))).join('\n');
+    const start = performance.now();
+    const res = await fetch(`${serverUrl}/events/batch`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/x-ndjson' },
+      body
+    });
+    const result = await res.json() as { rejected?: number };
+    const elapsed = performance.now() - start;
+    if (!res.ok) failures += count;
+    else failures += result.rejected || 0;
+    for (let i = 0; i < count; i++) latencies.push(elapsed);
+  }
+}
+
+const runAgent = mode === 'batch' ? runBatchAgent : runSingleAgent;
+const totalEvents = agents * eventsPerAgent;
+
+console.log(`Ingest benchmark: mode=${mode} agents=${agents} events/agent=${eventsPerAgent}${mode === 'batch' ? ` batch-size=${batchSize}` : ''}`);
+
+const started = performance.now();
+await Promise.all(Array.from({ length: agents }, (_, agent) => runAgent(agent)));
+const elapsedMs = performance.now() - started;
+
+latencies.sort((a, b) => a - b);
+
+console.log(`  events:      ${totalEvents} (${failures} failed)`);
+console.log(`  duration:    ${(elapsedMs / 1000).toFixed(2)}s`);
+console.log(`  throughput:  ${Math.round(totalEvents / (elapsedMs / 1000))} events/sec`);
+console.log(`  latency p50: ${percentile(latencies, 50).toFixed(2)}ms`);
+console.log(`  latency p99: ${percentile(latencies, 99).toFixed(2)}ms`);
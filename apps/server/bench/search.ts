@@ -0,0 +1,103 @@
+// Full-text search benchmark: fills a scratch database with synthetic events, then
+// compares FTS5 queries against the client's approach (build a lowercased string
+// per event and run a RegExp over all of them).
+//
+// Usage: bun bench/search.ts [--events 1000000] [--db /tmp/search-bench.db]
+
+import { tmpdir } from 'node:os';
+import { join } from 'node:path';
+import { rmSync } from 'node:fs';
+import { initDatabase, insertEvents, getRecentEvents, searchEvents } from '../src/db';
+import type { HookEvent } from '../src/types';
+
+const args = process.argv.slice(2);
+
+function getArg(name: string, fallback: string): string {
+  const index = args.indexOf(`--${name}`);
+  return index >= 0 && args[index + 1] ? args[index + 1]! : fallback;
+}
+
+const totalEvents = parseInt(getArg('events', '1000000'));
+const dbPath = getArg('db', join(tmpdir(), 'search-bench.db'));
+const queries = ['index.ts', 'npm install', 'migration', 'rm -rf', 'websocket backpressure'];
+const runs = 5;
+
+const tools = ['Bash', 'Read', 'Write', 'Edit', 'Grep', 'Glob'];
+const commands = ['npm install', 'bun test', 'git status', 'ls -la', 'rm -rf dist', 'cat package.json'];
+const files = ['src/index.ts', 'src/db.ts', 'README.md', 'apps/client/src/App.vue', 'migrations/0001_init.sql'];
+const summaries = ['Running the test suite', 'Reading database module', 'Writing migration for events table', 'Fixing websocket backpressure', 'Installing dependencies'];
+
+function makeEvent(i: number): HookEvent {
+  const tool = tools[i % tools.length]!;
+  return {
+    source_app: `bench-app-${i % 10}`,
+    session_id: `bench-session-${i % 500}`,
+    hook_event_type: i % 2 === 0 ? 'PreToolUse' : 'PostToolUse',
+    payload: {
+      tool_name: tool,
+      tool_input: tool === 'Bash'
+        ? { command: `${commands[i % commands.length]} --run ${i}` }
+        : { file_path: `/repo/${files[i % files.length]}` }
+    },
+    summary: i % 3 === 0 ? summaries[i % summaries.length] : undefined,
+    timestamp: 1_700_000_000_000 + i
+  };
+}
+
+function time<T>(fn: () => T): { result: T; ms: number } {
+  const start = performance.now();
+  const result = fn();
+  return { result, ms: performance.now() - start };
+}
+
+rmSync(dbPath, { force: true });
+initDatabase(dbPath);
+
+console.log(`Search benchmark: ${totalEvents} events in ${dbPath}`);
+
+const { ms: loadMs } = time(() => {
+  const chunk = 10_000;
+  for (let i = 0; i < totalEvents; i += chunk) {
+    insertEvents(Array.from({ length: Math.min(chunk, totalEvents - i) }, (_, j) => makeEvent(i + j)));
+  }
+});
+console.log(`  insert + index: ${(loadMs / 1000).toFixed(1)}s`);
+
+// Client-side baseline: every event must be in memory with a prebuilt search string
+const { result: searchable, ms: prepareMs } = time(() =>
+  getRecentEvents(totalEvents).map(event => [
+    event.hook_event_type,
+    event.source_app,
+    event.session_id,
+    event.payload.tool_name,
+    event.payload.tool_input?.command,
+    event.payload.tool_input?.file_path,
+    event.summary
+  ].filter(Boolean).join(' ').toLowerCase())
+);
+console.log(`  regex baseline: loading + building strings took ${(prepareMs / 1000).toFixed(1)}s`);
+
+console.log('');
+console.log('  query                      fts5 (ms)   regex (ms)   fts hits (page)   regex hits');
+for (const q of queries) {
+  let ftsMs = 0;
+  let ftsHits = 0;
+  for (let r = 0; r < runs; r++) {
+    const { result, ms } = time(() => searchEvents({ q, limit: 50 }));
+    ftsMs += ms;
+    ftsHits = result.results.length;
+  }
+
+  let regexMs = 0;
+  let regexHits = 0;
+  const pattern = new RegExp(q.replace(/[.*+?^${}()|[\]\\]/g, '\\$&'), 'i');
+  for (let r = 0; r < runs; r++) {
+    const { result, ms } = time(() => searchable.filter(text => pattern.test(text)).length);
+    regexMs += ms;
+    regexHits = result;
+  }
+
+  console.log(
+    `  ${q.padEnd(26)} ${(ftsMs / runs).toFixed(2).padStart(9)}   ${(regexMs / runs).toFixed(2).padStart(10)}   ${String(ftsHits).padStart(15)}   ${String(regexHits).padStart(10)}`
+  );
+}
@@ -0,0 +1,129 @@
+// /stream fan-out benchmark: connects many dashboard clients, a few of which stop
+// reading their socket, then publishes events and reports delivery latency for the
+// healthy clients and the server-side queue/drop stats for the slow ones.
+//
+// Usage (server must be running):
+//   bun bench/stream.ts [--clients 100] [--slow 5] [--events 5000] [--rate 500] [--summary-clients 50]
+
+import { connect, type Socket } from 'node:net';
+
+const args = process.argv.slice(2);
+
+function getArg(name: string, fallback: string): string {
+  const index = args.indexOf(`--${name}`);
+  return index >= 0 && args[index + 1] ? args[index + 1]! : fallback;
+}
+
+const serverUrl = new URL(getArg('url', 'http://localhost:4000'));
+const clientCount = parseInt(getArg('clients', '100'));
+const slowCount = parseInt(getArg('slow', '5'));
+const summaryClients = parseInt(getArg('summary-clients', '50'));
+const totalEvents = parseInt(getArg('events', '5000'));
+const rate = parseInt(getArg('rate', '500')); // events/sec
+const batchSize = 50;
+
+const wsUrl = `ws://${serverUrl.host}/stream`;
+
+function percentile(sorted: number[], p: number): number {
+  if (sorted.length === 0) return 0;
+  const index = Math.min(sorted.length - 1, Math.ceil((p / 100) * sorted.length) - 1);
+  return sorted[Math.max(0, index)]!;
+}
+
+// A slow client completes the WebSocket handshake and then stops reading, so the
+// kernel buffers fill up and the server sees real backpressure.
+function openSlowClient(): Promise<Socket> {
+  return new Promise((resolve, reject) => {
+    const socket = connect(parseInt(serverUrl.port || '80'), serverUrl.hostname, () => {
+      socket.write(
+        `GET /stream HTTP/1.1\r\n` +
+        `Host: ${serverUrl.host}\r\n` +
+        `Upgrade: websocket\r\n` +
+        `Connection: Upgrade\r\n` +
+        `Sec-WebSocket-Key: ${Buffer.from(crypto.getRandomValues(new Uint8Array(16))).toString('base64')}\r\n` +
+        `Sec-WebSocket-Version: 13\r\n\r\n`
+      );
+    });
+    socket.once('data', () => {
+      socket.pause();
+      resolve(socket);
+    });
+    socket.once('error', reject);
+  });
+}
+
+const latencies: number[] = [];
+let received = 0;
+
+function openFastClient(summary: boolean): Promise<WebSocket> {
+  return new Promise((resolve, reject) => {
+    const ws = new WebSocket(wsUrl);
+    let ready = false;
+    ws.onopen = () => {
+      if (summary) {
+        ws.send(JSON.stringify({ type: 'subscribe', data: { source_apps: ['bench-stream'], projection: 'summary' } }));
+      }
+    };
+    ws.onmessage = (message) => {
+      const data = JSON.parse(message.data as string);
+      // History arrives once the subscription is in place (or after the server's grace period)
+      if (!ready && data.type === 'initial') {
+        ready = true;
+        resolve(ws);
+        return;
+      }
+      if (data.type === 'event' && data.data.source_app === 'bench-stream') {
+        received++;
+        latencies.push(Date.now() - data.data.timestamp);
+      }
+    };
+    ws.onerror = reject;
+  });
+}
+
+console.log(`Stream benchmark: clients=${clientCount} slow=${slowCount} summary=${summaryClients} events=${totalEvents} rate=${rate}/s`);
+
+const slowSockets = await Promise.all(Array.from({ length: slowCount }, openSlowClient));
+const fastSockets = await Promise.all(
+  Array.from({ length: clientCount - slowCount }, (_, i) => openFastClient(i < summaryClients))
+);
+
+const started = performance.now();
+for (let sent = 0; sent < totalEvents; sent += batchSize) {
+  const count = Math.min(batchSize, totalEvents - sent);
+  const body = Array.from({ length: count }, (_, i) => JSON.stringify({
+    source_app: 'bench-stream',
+    session_id: `bench-session-${(sent + i) % 20}`,
+    hook_event_type: 'PostToolUse',
+    timestamp: Date.now(),
+    payload: {
+      tool_name: 'Read',
+      tool_response: { content: 'x'.repeat(2048) }
+    }
+  })).join('\n');
+  await fetch(`${serverUrl.origin}/events/batch`, { method: 'POST', body });
+
+  // Pace to the target rate
+  const expectedMs = ((sent + count) / rate) * 1000;
+  const aheadMs = expectedMs - (performance.now() - started);
+  if (aheadMs > 0) await Bun.sleep(aheadMs);
+}
+
+// Give healthy clients a moment to catch up
+await Bun.sleep(1000);
+
+const stats = await (await fetch(`${serverUrl.origin}/stream/stats`)).json() as any[];
+const lagging = stats.filter(s => s.queued > 0 || s.dropped > 0 || s.bufferedAmount > 0);
+const expected = totalEvents * (clientCount - slowCount);
+
+latencies.sort((a, b) => a - b);
+
+console.log(`  delivered to healthy clients: ${received}/${expected}`);
+console.log(`  delivery latency p50: ${percentile(latencies, 50)}ms  p99: ${percentile(latencies, 99)}ms`);
+console.log(`  lagging clients: ${lagging.length}`);
+for (const s of lagging) {
+  console.log(`    client ${s.id}: queued=${s.queued} dropped=${s.dropped} buffered=${(s.bufferedAmount / 1024).toFixed(0)}KB`);
+}
+
+fastSockets.forEach(ws => ws.close());
+slowSockets.forEach(socket => socket.destroy());
@@ -0,0 +1,16 @@
+// Rebuild the events_fts full-text index from the events table.
+//
+// Usage (from apps/server): bun run search:rebuild [path/to/events.db]
+
+import { initDatabase, rebuildSearchIndex } from '../src/db';
+
+const dbPath = process.argv[2] || 'events.db';
+
+// The rebuild below covers the backfill initDatabase would do for a new index
+initDatabase(dbPath, { backfillSearchIndex: false });
+
+const started = performance.now();
+const indexed = rebuildSearchIndex();
+const elapsed = performance.now() - started;
+
+console.log(`🔎 Indexed ${indexed} events in ${(elapsed / 1000).toFixed(2)}s (${dbPath})`);
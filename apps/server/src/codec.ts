@@ -0,0 +1,45 @@
+import { deflateRawSync, inflateRawSync } from 'node:zlib';
+
+// Compressed JSON columns are stored as BLOBs: one format byte followed by the data.
+// Uncompressed values stay TEXT, so readers can tell the two apart by type alone.
+const FORMAT_DEFLATE_DICT_V1 = 1;
+
+// Preset deflate dictionary built from the keys and values that repeat in almost every
+// hook payload and transcript message. Small events compress far better with it than
+// without, since deflate otherwise has no history to match against. Never edit this in
+// place: add a new dictionary and format byte instead, or existing rows become unreadable.
+const DICTIONARY_V1 = Buffer.from(
+  '{"session_id":"","transcript_path":"","cwd":"","permission_mode":"default","hook_event_name":"PreToolUse","PostToolUse",' +
+  '"UserPromptSubmit","Notification","Stop","SubagentStop","SessionStart","SessionEnd","PreCompact",' +
+  '"tool_name":"Bash","Read","Edit","MultiEdit","Write","Grep","Glob","Task","TodoWrite","WebFetch",' +
+  '"tool_input":{"command":"","description":"","file_path":"","old_string":"","new_string":"","content":"","pattern":"","path":""},' +
+  '"tool_response":{"stdout":"","stderr":"","interrupted":false,"isImage":false,"filePath":"","success":true},' +
+  '"prompt":"","message":"","stop_hook_active":false,"source":"startup","reason":"",' +
+  '"type":"assistant","user","message":{"role":"assistant","content":[{"type":"text","text":""},' +
+  '{"type":"tool_use","id":"toolu_","name":"","input":{}},{"type":"tool_result","tool_use_id":"toolu_","content":""}],' +
+  '"model":"claude-","stop_reason":null,"usage":{"input_tokens":0,"output_tokens":0,' +
+  '"cache_read_input_tokens":0,"cache_creation_input_tokens":0}},"uuid":"","parentUuid":"","isSidechain":false,' +
+  '"userType":"external","version":"","gitBranch":"","requestId":"req_","timestamp":"'
+);
+
+export function compressJson(json: string): Uint8Array {
+  const compressed = deflateRawSync(Buffer.from(json), { dictionary: DICTIONARY_V1, level: 9 });
+  const encoded = new Uint8Array(compressed.length + 1);
+  encoded[0] = FORMAT_DEFLATE_DICT_V1;
+  encoded.set(compressed, 1);
+  return encoded;
+}
+
+export function decompressJson(value: Uint8Array): string {
+  const format = value[0];
+  if (format !== FORMAT_DEFLATE_DICT_V1) {
+    throw new Error(`Unknown compressed column format: ${format}`);
+  }
+  return inflateRawSync(value.subarray(1), { dictionary: DICTIONARY_V1 }).toString();
+}
+
+// Parse a JSON column that may be plain TEXT or a compressed BLOB
+export function decodeJson(value: string | Uint8Array | null | undefined): any {
+  if (value === null || value === undefined) return undefined;
+  return JSON.parse(typeof value === 'string' ? value : decompressJson(value));
+}
@@ -1,10 +1,32 @@
-import { Database } from 'bun:sqlite';
-import type { HookEvent, FilterOptions, Theme, ThemeSearchQuery } from './types';
+import { Database, type Statement } from 'bun:sqlite';
+import type { HookEvent, FilterOptions, Theme, ThemeSearchQuery, EventCursor, EventQuery, EventQueryResult, EventSummary, EventSearchQuery, EventSearchResult, DatabaseStats, EventCountRow, HumanInTheLoopResponse, HumanInTheLoopStatus } from './types';
+import { compressJson, decodeJson } from './codec';
 
 let db: Database;
 
-export function initDatabase(): void {
-  db = new Database('events.db');
+// Prepared statements that are reused on the hot ingest path
+let insertEventStmt: Statement | null = null;
+let insertChatSegmentStmt: Statement | null = null;
+let insertEventsTx: ((events: HookEvent[]) => HookEvent[]) | null = null;
+
+// Upper bound on page size for /events/query and /events/search
+const MAX_QUERY_LIMIT = 1000;
+
+// `backfillSearchIndex: false` leaves a newly created events_fts empty for the caller to rebuild
+export function initDatabase(path: string = 'events.db', options: { backfillSearchIndex?: boolean } = {}): void {
+  db = new Database(path);
+  
+  // Incremental auto-vacuum lets maintenance return freed pages to the OS without a full VACUUM.
+  // A new database gets it for free; an existing one needs one full VACUUM, which rewrites the
+  // whole file and is left to an explicit `POST /admin/maintenance?vacuum=full`.
+  if (!isIncrementalVacuumEnabled()) {
+    const hasTables = db.prepare("SELECT 1 FROM sqlite_master WHERE type = 'table'").get();
+    if (hasTables) {
+      console.log('[db] Incremental vacuum is off; run POST /admin/maintenance?vacuum=full once to enable it');
+    } else {
+      db.exec('PRAGMA auto_vacuum = INCREMENTAL');
+    }
+  }
   
   // Enable WAL mode for better concurrent performance
   db.exec('PRAGMA journal_mode = WAL');
@@ -55,6 +77,12 @@ export function initDatabase(): void {
     if (!hasModelNameColumn) {
       db.exec('ALTER TABLE events ADD COLUMN model_name TEXT');
     }
+
+    // Check if chat_message_count column exists, add it if not (for migration)
+    const hasChatMessageCountColumn = columns.some((col: any) => col.name === 'chat_message_count');
+    if (!hasChatMessageCountColumn) {
+      db.exec('ALTER TABLE events ADD COLUMN chat_message_count INTEGER');
+    }
   } catch (error) {
     // If the table doesn't exist yet, the CREATE TABLE above will handle it
   }
@@ -65,6 +93,59 @@ export function initDatabase(): void {
   db.exec('CREATE INDEX IF NOT EXISTS idx_hook_event_type ON events(hook_event_type)');
   db.exec('CREATE INDEX IF NOT EXISTS idx_timestamp ON events(timestamp)');
   
+  // Composite indexes for /events/query range scans (rowid is implicitly the last key column)
+  db.exec('CREATE INDEX IF NOT EXISTS idx_session_timestamp ON events(session_id, timestamp)');
+  db.exec('CREATE INDEX IF NOT EXISTS idx_app_type_timestamp ON events(source_app, hook_event_type, timestamp)');
+  
+  // Partial index over the (few) HITL requests still awaiting an answer
+  db.exec(`CREATE INDEX IF NOT EXISTS idx_hitl_pending ON events(id) WHERE json_extract(humanInTheLoopStatus, '$.status') = 'pending'`);
+  
+  // Create full-text search index and its sync triggers
+  initSearchIndex(options.backfillSearchIndex ?? true);
+  
+  // Create chat segments table (incremental transcript deltas, keyed by position in the session)
+  db.exec(`
+    CREATE TABLE IF NOT EXISTS chat_segments (
+      session_id TEXT NOT NULL,
+      start_index INTEGER NOT NULL,
+      messages TEXT NOT NULL,
+      event_id INTEGER,
+      PRIMARY KEY (session_id, start_index)
+    )
+  `);
+  
+  // Create rollup tables: per-minute counts for events removed by retention,
+  // compacted further into per-hour counts once they age out too
+  db.exec(`
+    CREATE TABLE IF NOT EXISTS event_rollups_minute (
+      bucket INTEGER NOT NULL,
+      source_app TEXT NOT NULL,
+      session_id TEXT NOT NULL,
+      hook_event_type TEXT NOT NULL,
+      count INTEGER NOT NULL,
+      PRIMARY KEY (bucket, source_app, session_id, hook_event_type)
+    )
+  `);
+  
+  db.exec(`
+    CREATE TABLE IF NOT EXISTS event_rollups_hour (
+      bucket INTEGER NOT NULL,
+      source_app TEXT NOT NULL,
+      hook_event_type TEXT NOT NULL,
+      count INTEGER NOT NULL,
+      session_count INTEGER NOT NULL,
+      PRIMARY KEY (bucket, source_app, hook_event_type)
+    )
+  `);
+  
+  // Create maintenance state table (watermarks for incremental background jobs)
+  db.exec(`
+    CREATE TABLE IF NOT EXISTS maintenance_state (
+      key TEXT PRIMARY KEY,
+      value INTEGER NOT NULL
+    )
+  `);
+  
   // Create themes table
   db.exec(`
     CREATE TABLE IF NOT EXISTS themes (
@@ -122,12 +203,28 @@ export function initDatabase(): void {
   db.exec('CREATE INDEX IF NOT EXISTS idx_theme_ratings_theme ON theme_ratings(themeId)');
 }
 
-export function insertEvent(event: HookEvent): HookEvent {
-  const stmt = db.prepare(`
-    INSERT INTO events (source_app, session_id, hook_event_type, payload, chat, summary, timestamp, humanInTheLoop, humanInTheLoopStatus, model_name)
-    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-  `);
+function getInsertEventStmt(): Statement {
+  if (!insertEventStmt) {
+    insertEventStmt = db.prepare(`
+      INSERT INTO events (source_app, session_id, hook_event_type, payload, chat, summary, timestamp, humanInTheLoop, humanInTheLoopStatus, model_name, chat_message_count)
+      VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    `);
+  }
+  return insertEventStmt;
+}
+
+function getInsertChatSegmentStmt(): Statement {
+  if (!insertChatSegmentStmt) {
+    // Replace on conflict so a resent delta (hook retry) doesn't duplicate messages
+    insertChatSegmentStmt = db.prepare(`
+      INSERT OR REPLACE INTO chat_segments (session_id, start_index, messages, event_id)
+      VALUES (?, ?, ?, ?)
+    `);
+  }
+  return insertChatSegmentStmt;
+}
 
+export function insertEvent(event: HookEvent): HookEvent {
   const timestamp = event.timestamp || Date.now();
 
   // Initialize humanInTheLoopStatus to pending if humanInTheLoop exists
@@ -136,7 +233,16 @@ export function insertEvent(event: HookEvent): HookEvent {
     humanInTheLoopStatus = { status: 'pending' };
   }
 
-  const result = stmt.run(
+  // Chat arrives either as the full transcript or as a delta since the previous event
+  const { chat_delta, chat_offset, ...storedEvent } = event;
+  let chatMessageCount = event.chat_message_count;
+  if (chat_delta) {
+    chatMessageCount = (chat_offset || 0) + chat_delta.length;
+  } else if (event.chat) {
+    chatMessageCount = event.chat.length;
+  }
+
+  const result = getInsertEventStmt().run(
     event.source_app,
     event.session_id,
     event.hook_event_type,
@@ -146,17 +252,228 @@ export function insertEvent(event: HookEvent): HookEvent {
     timestamp,
     event.humanInTheLoop ? JSON.stringify(event.humanInTheLoop) : null,
     humanInTheLoopStatus ? JSON.stringify(humanInTheLoopStatus) : null,
-    event.model_name || null
+    event.model_name || null,
+    chatMessageCount ?? null
   );
+  const id = result.lastInsertRowid as number;
+
+  if (chat_delta && chat_delta.length > 0) {
+    getInsertChatSegmentStmt().run(event.session_id, chat_offset || 0, JSON.stringify(chat_delta), id);
+  }
 
   return {
-    ...event,
-    id: result.lastInsertRowid as number,
+    ...storedEvent,
+    id,
     timestamp,
-    humanInTheLoopStatus
+    humanInTheLoopStatus,
+    chat_message_count: chatMessageCount
+  };
+}
+
+// Full-text search over fields extracted from payload JSON. Triggers keep it in sync
+// with every write path; compressed payloads keep the entry made when the row was
+// written, and rebuildSearchIndex() decodes them in JS.
+const SEARCH_COLUMNS_SQL = `
+  json_extract(new.payload, '$.tool_name'),
+  json_extract(new.payload, '$.tool_input.command'),
+  coalesce(json_extract(new.payload, '$.tool_input.file_path'), json_extract(new.payload, '$.tool_input.path'), json_extract(new.payload, '$.tool_input.notebook_path')),
+  coalesce(json_extract(new.payload, '$.prompt'), json_extract(new.payload, '$.message')),
+  new.summary
+`;
+
+function initSearchIndex(backfill: boolean): void {
+  const exists = db.prepare("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'events_fts'").get();
+
+  db.exec(`
+    CREATE VIRTUAL TABLE IF NOT EXISTS events_fts USING fts5(
+      tool_name, command, file_path, prompt, summary,
+      tokenize = 'unicode61'
+    )
+  `);
+
+  db.exec(`
+    CREATE TRIGGER IF NOT EXISTS events_fts_insert AFTER INSERT ON events
+    WHEN json_valid(new.payload)
+    BEGIN
+      INSERT INTO events_fts (rowid, tool_name, command, file_path, prompt, summary)
+      VALUES (new.id, ${SEARCH_COLUMNS_SQL});
+    END
+  `);
+
+  db.exec(`
+    CREATE TRIGGER IF NOT EXISTS events_fts_delete AFTER DELETE ON events
+    BEGIN
+      DELETE FROM events_fts WHERE rowid = old.id;
+    END
+  `);
+
+  // Only reindex when the new payload is still JSON, so re-encoding a payload keeps its entry
+  db.exec(`
+    CREATE TRIGGER IF NOT EXISTS events_fts_update AFTER UPDATE OF payload, summary ON events
+    WHEN json_valid(new.payload)
+    BEGIN
+      DELETE FROM events_fts WHERE rowid = old.id;
+      INSERT INTO events_fts (rowid, tool_name, command, file_path, prompt, summary)
+      VALUES (new.id, ${SEARCH_COLUMNS_SQL});
+    END
+  `);
+
+  // Backfill once when the index is added to an existing database
+  if (!exists && backfill) {
+    rebuildSearchIndex();
+  }
+}
+
+// JS twin of SEARCH_COLUMNS_SQL (minus summary) for payloads SQLite can't parse
+function searchFields(payload: any): (string | null)[] {
+  const text = (value: unknown) => {
+    if (value === undefined || value === null) return null;
+    return typeof value === 'object' ? JSON.stringify(value) : String(value);
+  };
+  const input = payload?.tool_input ?? {};
+  return [
+    text(payload?.tool_name),
+    text(input.command),
+    text(input.file_path ?? input.path ?? input.notebook_path),
+    text(payload?.prompt ?? payload?.message)
+  ];
+}
+
+// Drop and repopulate the full-text index from the events table; returns indexed row count
+export function rebuildSearchIndex(): number {
+  const rebuild = db.transaction(() => {
+    db.exec('DELETE FROM events_fts');
+    const result = db.prepare(`
+      INSERT INTO events_fts (rowid, tool_name, command, file_path, prompt, summary)
+      SELECT new.id, ${SEARCH_COLUMNS_SQL}
+      FROM events AS new
+      WHERE json_valid(new.payload)
+    `).run();
+
+    // Compressed payloads are BLOBs SQLite can't read; extract the same fields in JS
+    const insert = db.prepare(`
+      INSERT INTO events_fts (rowid, tool_name, command, file_path, prompt, summary)
+      VALUES (?, ?, ?, ?, ?, ?)
+    `);
+    const compressed = db.prepare(`
+      SELECT id, payload, summary FROM events
+      WHERE typeof(payload) = 'blob' AND NOT json_valid(payload) AND id > ?
+      ORDER BY id LIMIT 1000
+    `);
+    let decoded = 0;
+    let lastId = 0;
+    for (;;) {
+      const rows = compressed.all(lastId) as { id: number; payload: Uint8Array; summary: string | null }[];
+      if (rows.length === 0) break;
+      for (const row of rows) {
+        let payload: any;
+        try {
+          payload = decodeJson(row.payload);
+        } catch {
+          continue;
+        }
+        insert.run(row.id, ...searchFields(payload), row.summary);
+        decoded++;
+      }
+      lastId = rows[rows.length - 1]!.id;
+    }
+
+    return result.changes + decoded;
+  });
+
+  const indexed = rebuild();
+  db.exec("INSERT INTO events_fts (events_fts) VALUES ('optimize')");
+  return indexed;
+}
+
+// Turn free text into an FTS5 query: each whitespace-separated term becomes a quoted prefix phrase
+function toMatchQuery(text: string): string {
+  return text
+    .split(/\s+/)
+    .filter(term => term.length > 0)
+    .map(term => `"${term.replace(/"/g, '""')}"*`)
+    .join(' ');
+}
+
+// snippet() wraps matches in these control characters; the text around them is
+// HTML-escaped before they are swapped for the real markers
+const SNIPPET_START = '\u0002';
+const SNIPPET_END = '\u0003';
+
+function escapeHtml(text: string): string {
+  return text
+    .replace(/&/g, '&amp;')
+    .replace(/</g, '&lt;')
+    .replace(/>/g, '&gt;')
+    .replace(/"/g, '&quot;')
+    .replace(/'/g, '&#39;');
+}
+
+function highlightSnippet(snippet: string, markStart: string, markEnd: string): string {
+  return escapeHtml(snippet).replaceAll(SNIPPET_START, markStart).replaceAll(SNIPPET_END, markEnd);
+}
+
+export function searchEvents(query: EventSearchQuery): EventSearchResult {
+  const match = toMatchQuery(query.q);
+  const limit = Math.min(Math.max(query.limit || 50, 1), MAX_QUERY_LIMIT);
+  const offset = Math.max(query.offset || 0, 0);
+
+  if (!match) {
+    return { results: [], has_more: false };
+  }
+
+  let sql = `
+    SELECT e.id, e.source_app, e.session_id, e.hook_event_type, e.summary, e.timestamp, e.model_name,
+      snippet(events_fts, -1, ?, ?, '…', 12) AS snippet,
+      bm25(events_fts) AS rank
+    FROM events_fts
+    JOIN events e ON e.id = events_fts.rowid
+    WHERE events_fts MATCH ?
+  `;
+  const params: any[] = [SNIPPET_START, SNIPPET_END, match];
+
+  const addInFilter = (column: string, values?: string[]) => {
+    if (!values || values.length === 0) return;
+    sql += ` AND ${column} IN (${values.map(() => '?').join(', ')})`;
+    params.push(...values);
+  };
+  addInFilter('e.source_app', query.source_apps);
+  addInFilter('e.session_id', query.session_ids);
+  addInFilter('e.hook_event_type', query.hook_event_types);
+
+  sql += ' ORDER BY rank LIMIT ? OFFSET ?';
+  params.push(limit + 1, offset);
+
+  const rows = db.prepare(sql).all(...params) as any[];
+  const hasMore = rows.length > limit;
+  if (hasMore) rows.pop();
+
+  return {
+    results: rows.map(row => ({
+      event: {
+        id: row.id,
+        source_app: row.source_app,
+        session_id: row.session_id,
+        hook_event_type: row.hook_event_type,
+        summary: row.summary || undefined,
+        timestamp: row.timestamp,
+        model_name: row.model_name || undefined
+      },
+      snippet: highlightSnippet(row.snippet ?? '', query.markStart ?? '<mark>', query.markEnd ?? '</mark>'),
+      rank: row.rank
+    })),
+    has_more: hasMore
   };
 }
 
+// Insert several events in a single transaction (one WAL commit for the whole batch)
+export function insertEvents(events: HookEvent[]): HookEvent[] {
+  if (!insertEventsTx) {
+    insertEventsTx = db.transaction((batch: HookEvent[]) => batch.map(insertEvent));
+  }
+  return insertEventsTx(events);
+}
+
 export function getFilterOptions(): FilterOptions {
   const sourceApps = db.prepare('SELECT DISTINCT source_app FROM events ORDER BY source_app').all() as { source_app: string }[];
   const sessionIds = db.prepare('SELECT DISTINCT session_id FROM events ORDER BY session_id DESC LIMIT 100').all() as { session_id: string }[];
@@ -171,7 +488,7 @@ export function getFilterOptions(): FilterOptions {
 
 export function getRecentEvents(limit: number = 100): HookEvent[] {
   const stmt = db.prepare(`
-    SELECT id, source_app, session_id, hook_event_type, payload, chat, summary, timestamp, humanInTheLoop, humanInTheLoopStatus, model_name
+    SELECT id, source_app, session_id, hook_event_type, payload, chat, summary, timestamp, humanInTheLoop, humanInTheLoopStatus, model_name, chat_message_count
     FROM events
     ORDER BY timestamp DESC
     LIMIT ?
@@ -184,16 +501,314 @@ export function getRecentEvents(limit: number = 100): HookEvent[] {
     source_app: row.source_app,
     session_id: row.session_id,
     hook_event_type: row.hook_event_type,
-    payload: JSON.parse(row.payload),
-    chat: row.chat ? JSON.parse(row.chat) : undefined,
+    payload: decodeJson(row.payload),
+    chat: row.chat ? decodeJson(row.chat) : undefined,
     summary: row.summary || undefined,
     timestamp: row.timestamp,
     humanInTheLoop: row.humanInTheLoop ? JSON.parse(row.humanInTheLoop) : undefined,
     humanInTheLoopStatus: row.humanInTheLoopStatus ? JSON.parse(row.humanInTheLoopStatus) : undefined,
-    model_name: row.model_name || undefined
+    model_name: row.model_name || undefined,
+    chat_message_count: row.chat_message_count ?? undefined
   })).reverse();
 }
 
+function encodeEventCursor(event: EventSummary | undefined): string | undefined {
+  return event ? `${event.timestamp}:${event.id}` : undefined;
+}
+
+export function parseEventCursor(value: string): EventCursor | null {
+  const match = /^(\d+):(\d+)$/.exec(value);
+  return match ? { timestamp: parseInt(match[1]!), id: parseInt(match[2]!) } : null;
+}
+
+// Keyset-paginated event query. Pages are ordered by (timestamp, id) so the composite
+// indexes can serve both the filter and the sort; cursors are "timestamp:id" positions.
+export function queryEvents(query: EventQuery = {}): EventQueryResult {
+  const limit = Math.min(Math.max(query.limit || 100, 1), MAX_QUERY_LIMIT);
+
+  const columns = ['id', 'source_app', 'session_id', 'hook_event_type', 'summary', 'timestamp', 'humanInTheLoop', 'humanInTheLoopStatus', 'model_name', 'chat_message_count'];
+  if (query.includePayload) columns.push('payload');
+  if (query.includeChat) columns.push('chat');
+
+  let sql = `SELECT ${columns.join(', ')} FROM events WHERE 1=1`;
+  const params: any[] = [];
+
+  const addInFilter = (column: string, values?: string[]) => {
+    if (!values || values.length === 0) return;
+    sql += ` AND ${column} IN (${values.map(() => '?').join(', ')})`;
+    params.push(...values);
+  };
+
+  addInFilter('source_app', query.source_apps);
+  addInFilter('session_id', query.session_ids);
+  addInFilter('hook_event_type', query.hook_event_types);
+  addInFilter('model_name', query.model_names);
+
+  if (query.since !== undefined) {
+    sql += ' AND timestamp >= ?';
+    params.push(query.since);
+  }
+  if (query.until !== undefined) {
+    sql += ' AND timestamp <= ?';
+    params.push(query.until);
+  }
+
+  // The cursor carries its own position, so the event it points at may be gone
+  const paginateForward = query.after !== undefined && query.before === undefined;
+  const cursor = paginateForward ? query.after : query.before;
+  if (cursor) {
+    sql += paginateForward ? ' AND (timestamp, id) > (?, ?)' : ' AND (timestamp, id) < (?, ?)';
+    params.push(cursor.timestamp, cursor.id);
+  }
+
+  sql += paginateForward ? ' ORDER BY timestamp ASC, id ASC' : ' ORDER BY timestamp DESC, id DESC';
+  sql += ' LIMIT ?';
+  params.push(limit + 1);
+
+  const rows = db.prepare(sql).all(...params) as any[];
+  const hasMore = rows.length > limit;
+  if (hasMore) rows.pop();
+  if (!paginateForward) rows.reverse();
+
+  const events: EventSummary[] = rows.map(row => ({
+    id: row.id,
+    source_app: row.source_app,
+    session_id: row.session_id,
+    hook_event_type: row.hook_event_type,
+    ...(query.includePayload ? { payload: decodeJson(row.payload) } : {}),
+    ...(query.includeChat && row.chat ? { chat: decodeJson(row.chat) } : {}),
+    summary: row.summary || undefined,
+    timestamp: row.timestamp,
+    humanInTheLoop: row.humanInTheLoop ? JSON.parse(row.humanInTheLoop) : undefined,
+    humanInTheLoopStatus: row.humanInTheLoopStatus ? JSON.parse(row.humanInTheLoopStatus) : undefined,
+    model_name: row.model_name || undefined,
+    chat_message_count: row.chat_message_count ?? undefined
+  }));
+
+  return {
+    events,
+    has_more: hasMore,
+    before: encodeEventCursor(events[0]),
+    after: encodeEventCursor(events[events.length - 1])
+  };
+}
+
+// Reassemble a session transcript from its chat segments, optionally truncated to the
+// first `upto` messages (the transcript as it looked when a given event was recorded)
+export function getSessionChat(sessionId: string, upto?: number): any[] {
+  const stmt = db.prepare(`
+    SELECT start_index, messages
+    FROM chat_segments
+    WHERE session_id = ? AND start_index < ?
+    ORDER BY start_index ASC
+  `);
+
+  const rows = stmt.all(sessionId, upto ?? Number.MAX_SAFE_INTEGER) as { start_index: number; messages: string }[];
+
+  const chat: any[] = [];
+  for (const row of rows) {
+    const messages = JSON.parse(row.messages) as any[];
+    // Segments may overlap if a hook resent from an older offset; later writes win
+    messages.forEach((message, i) => {
+      chat[row.start_index + i] = message;
+    });
+  }
+
+  const assembled = chat.filter(message => message !== undefined);
+  return upto !== undefined ? assembled.slice(0, upto) : assembled;
+}
+
+// Per-second event counts since `since`, used to seed the in-memory metrics buckets
+export function getEventCountsSince(since: number): EventCountRow[] {
+  return db.prepare(`
+    SELECT (timestamp / 1000) * 1000 AS bucket, source_app, session_id, hook_event_type, COUNT(*) AS count
+    FROM events
+    WHERE timestamp >= ?
+    GROUP BY 1, 2, 3, 4
+    ORDER BY 1
+  `).all(since) as EventCountRow[];
+}
+
+// Maintenance helpers (used by the background maintenance subsystem)
+export function getEventGroups(): { source_app: string; hook_event_type: string }[] {
+  return db.prepare('SELECT DISTINCT source_app, hook_event_type FROM events').all() as { source_app: string; hook_event_type: string }[];
+}
+
+// Let ingest, /stream and timers run between maintenance chunks
+const yieldBetweenChunks = () => new Promise(resolve => setTimeout(resolve, 0));
+
+// Roll up and delete events of one source_app/event type older than `before`.
+// Works in chunks, yielding between them, so neither a write transaction nor the
+// event loop is held for long; resolves to the number deleted.
+export async function expireEvents(sourceApp: string, hookEventType: string, before: number, chunkSize: number = 5000): Promise<number> {
+  const selectIds = db.prepare(`
+    SELECT id FROM events
+    WHERE source_app = ? AND hook_event_type = ? AND timestamp < ?
+    LIMIT ?
+  `);
+  const rollup = db.prepare(`
+    INSERT INTO event_rollups_minute (bucket, source_app, session_id, hook_event_type, count)
+    SELECT (timestamp / 60000) * 60000, source_app, session_id, hook_event_type, COUNT(*)
+    FROM events
+    WHERE id IN (SELECT value FROM json_each(?))
+    GROUP BY 1, 2, 3, 4
+    ON CONFLICT (bucket, source_app, session_id, hook_event_type) DO UPDATE SET count = count + excluded.count
+  `);
+  const remove = db.prepare('DELETE FROM events WHERE id IN (SELECT value FROM json_each(?))');
+
+  const expireChunk = db.transaction((ids: string) => {
+    rollup.run(ids);
+    return remove.run(ids).changes;
+  });
+
+  let deleted = 0;
+  while (true) {
+    const rows = selectIds.all(sourceApp, hookEventType, before, chunkSize) as { id: number }[];
+    if (rows.length === 0) break;
+    deleted += expireChunk(JSON.stringify(rows.map(row => row.id)));
+    if (rows.length < chunkSize) break;
+    await yieldBetweenChunks();
+  }
+
+  // Chat segments are per session; drop them once no event of the session remains
+  if (deleted > 0) {
+    db.exec('DELETE FROM chat_segments WHERE session_id NOT IN (SELECT DISTINCT session_id FROM events)');
+  }
+
+  return deleted;
+}
+
+// Fold minute rollups older than `before` into hour rollups; returns minute rows removed.
+// Only whole hours are folded: session_count can't be merged exactly, so an hour folded in two
+// runs would count its sessions twice. It stays an upper bound if late minute rows (from events
+// expired after their hour was folded) are added onto an existing hour row.
+export function compactMinuteRollups(before: number): number {
+  before = Math.floor(before / 3600000) * 3600000;
+  const compact = db.transaction(() => {
+    db.prepare(`
+      INSERT INTO event_rollups_hour (bucket, source_app, hook_event_type, count, session_count)
+      SELECT (bucket / 3600000) * 3600000, source_app, hook_event_type, SUM(count), COUNT(DISTINCT session_id)
+      FROM event_rollups_minute
+      WHERE bucket < ?
+      GROUP BY 1, 2, 3
+      ON CONFLICT (bucket, source_app, hook_event_type) DO UPDATE SET
+        count = count + excluded.count,
+        session_count = session_count + excluded.session_count
+    `).run(before);
+    return db.prepare('DELETE FROM event_rollups_minute WHERE bucket < ?').run(before).changes;
+  });
+  return compact();
+}
+
+function getMaintenanceState(key: string): number {
+  const row = db.prepare('SELECT value FROM maintenance_state WHERE key = ?').get(key) as { value: number } | null;
+  return row?.value ?? 0;
+}
+
+function setMaintenanceState(key: string, value: number): void {
+  db.prepare('INSERT INTO maintenance_state (key, value) VALUES (?, ?) ON CONFLICT (key) DO UPDATE SET value = excluded.value').run(key, value);
+}
+
+// Compress payload/chat of events older than `before` that are still plain JSON text.
+// A watermark skips the already-compressed range, and the loop yields between chunks;
+// resolves to { events, bytesSaved }.
+export async function compressEventsBefore(before: number, chunkSize: number = 1000): Promise<{ events: number; bytesSaved: number }> {
+  let from = getMaintenanceState('compressed_until');
+  const selectRows = db.prepare(`
+    SELECT id, timestamp, payload, chat FROM events
+    WHERE timestamp >= ? AND timestamp < ? AND (typeof(payload) = 'text' OR typeof(chat) = 'text')
+    ORDER BY timestamp
+    LIMIT ?
+  `);
+  const update = db.prepare('UPDATE events SET payload = ?, chat = ? WHERE id = ?');
+
+  type Row = { id: number; timestamp: number; payload: string | Uint8Array; chat: string | Uint8Array | null };
+  const compressChunk = db.transaction((rows: Row[]) => {
+    let bytesSaved = 0;
+    for (const row of rows) {
+      const payload = typeof row.payload === 'string' ? compressJson(row.payload) : row.payload;
+      const chat = typeof row.chat === 'string' ? compressJson(row.chat) : row.chat;
+      bytesSaved += (typeof row.payload === 'string' ? Buffer.byteLength(row.payload) - payload.length : 0)
+        + (typeof row.chat === 'string' ? Buffer.byteLength(row.chat) - chat!.length : 0);
+      update.run(payload, chat, row.id);
+    }
+    return bytesSaved;
+  });
+
+  const watermark = Math.max(from, before);
+  let events = 0;
+  let bytesSaved = 0;
+  while (true) {
+    const rows = selectRows.all(from, before, chunkSize) as Row[];
+    if (rows.length === 0) break;
+    bytesSaved += compressChunk(rows);
+    events += rows.length;
+    if (rows.length < chunkSize) break;
+    // Resume from the last timestamp seen rather than rescanning compressed rows
+    from = rows[rows.length - 1]!.timestamp;
+    await yieldBetweenChunks();
+  }
+
+  setMaintenanceState('compressed_until', watermark);
+  return { events, bytesSaved };
+}
+
+function isIncrementalVacuumEnabled(): boolean {
+  const { auto_vacuum } = db.prepare('PRAGMA auto_vacuum').get() as { auto_vacuum: number };
+  return auto_vacuum === 2;
+}
+
+// Return free pages to the filesystem and truncate the WAL; returns bytes reclaimed
+export function incrementalVacuum(): number {
+  const before = getDatabaseFileSize();
+  // Without auto_vacuum = INCREMENTAL this is a no-op; free pages are reused in place
+  if (isIncrementalVacuumEnabled()) {
+    db.exec('PRAGMA incremental_vacuum');
+  }
+  db.exec('PRAGMA wal_checkpoint(TRUNCATE)');
+  return Math.max(0, before - getDatabaseFileSize());
+}
+
+// Switch an existing database to incremental auto-vacuum. This takes one full VACUUM, which
+// rewrites the file and blocks writers until done; returns bytes reclaimed.
+export function enableIncrementalVacuum(): number {
+  if (isIncrementalVacuumEnabled()) return 0;
+
+  const before = getDatabaseFileSize();
+  console.log(`[db] Full VACUUM to enable incremental vacuum (${before} bytes)...`);
+  const startedAt = Date.now();
+  db.exec('PRAGMA auto_vacuum = INCREMENTAL');
+  db.exec('VACUUM');
+  db.exec('PRAGMA wal_checkpoint(TRUNCATE)');
+  const after = getDatabaseFileSize();
+  console.log(`[db] Full VACUUM done in ${Date.now() - startedAt}ms (${after} bytes)`);
+  return Math.max(0, before - after);
+}
+
+function getDatabaseFileSize(): number {
+  const { page_count } = db.prepare('PRAGMA page_count').get() as { page_count: number };
+  const { page_size } = db.prepare('PRAGMA page_size').get() as { page_size: number };
+  return page_count * page_size;
+}
+
+export function getDatabaseStats(): DatabaseStats {
+  const pragma = (name: string) => (db.prepare(`PRAGMA ${name}`).get() as Record<string, number>)[name]!;
+  const count = (table: string) => (db.prepare(`SELECT COUNT(*) AS n FROM ${table}`).get() as { n: number }).n;
+  const pageSize = pragma('page_size');
+
+  return {
+    sizeBytes: pragma('page_count') * pageSize,
+    freeBytes: pragma('freelist_count') * pageSize,
+    pageSize,
+    incrementalVacuum: isIncrementalVacuumEnabled(),
+    events: count('events'),
+    compressedEvents: (db.prepare("SELECT COUNT(*) AS n FROM events WHERE typeof(payload) = 'blob'").get() as { n: number }).n,
+    minuteRollups: count('event_rollups_minute'),
+    hourRollups: count('event_rollups_hour'),
+    chatSegments: count('chat_segments')
+  };
+}
+
 // Theme database functions
 export function insertTheme(theme: Theme): Theme {
   const stmt = db.prepare(`
@@ -350,22 +965,20 @@ export function incrementThemeDownloadCount(id: string): boolean {
 }
 
 // HITL helper functions
-export function updateEventHITLResponse(id: number, response: any): HookEvent | null {
-  const status = {
-    status: 'responded',
-    respondedAt: response.respondedAt,
-    response
-  };
-
-  const stmt = db.prepare('UPDATE events SET humanInTheLoopStatus = ? WHERE id = ?');
-  stmt.run(JSON.stringify(status), id);
+// HITL status changes are a single UPDATE ... RETURNING guarded by the current status,
+// so a late answer can't overwrite a timeout (or the reverse) and no follow-up SELECT is
+// needed. The new status object is returned as-is instead of being re-parsed.
+let transitionHITLStmt: Statement | null = null;
 
-  const selectStmt = db.prepare(`
-    SELECT id, source_app, session_id, hook_event_type, payload, chat, summary, timestamp, humanInTheLoop, humanInTheLoopStatus, model_name
-    FROM events
-    WHERE id = ?
-  `);
-  const row = selectStmt.get(id) as any;
+function transitionHITLStatus(id: number, from: HumanInTheLoopStatus['status'], status: HumanInTheLoopStatus): HookEvent | null {
+  if (!transitionHITLStmt) {
+    transitionHITLStmt = db.prepare(`
+      UPDATE events SET humanInTheLoopStatus = ?
+      WHERE id = ? AND json_extract(humanInTheLoopStatus, '$.status') = ?
+      RETURNING id, source_app, session_id, hook_event_type, payload, chat, summary, timestamp, humanInTheLoop, model_name, chat_message_count
+    `);
+  }
+  const row = transitionHITLStmt.get(JSON.stringify(status), id, from) as any;
 
   if (!row) return null;
 
@@ -374,14 +987,53 @@ export function updateEventHITLResponse(id: number, response: any): HookEvent |
     source_app: row.source_app,
     session_id: row.session_id,
     hook_event_type: row.hook_event_type,
-    payload: JSON.parse(row.payload),
-    chat: row.chat ? JSON.parse(row.chat) : undefined,
+    payload: decodeJson(row.payload),
+    chat: row.chat ? decodeJson(row.chat) : undefined,
     summary: row.summary || undefined,
     timestamp: row.timestamp,
     humanInTheLoop: row.humanInTheLoop ? JSON.parse(row.humanInTheLoop) : undefined,
-    humanInTheLoopStatus: row.humanInTheLoopStatus ? JSON.parse(row.humanInTheLoopStatus) : undefined,
-    model_name: row.model_name || undefined
+    humanInTheLoopStatus: status,
+    model_name: row.model_name || undefined,
+    chat_message_count: row.chat_message_count ?? undefined
   };
 }
 
+// Returns null if the event doesn't exist or its request is no longer pending
+export function updateEventHITLResponse(id: number, response: HumanInTheLoopResponse): HookEvent | null {
+  return transitionHITLStatus(id, 'pending', {
+    status: 'responded',
+    respondedAt: response.respondedAt,
+    response
+  });
+}
+
+export function expireHITLRequest(id: number): HookEvent | null {
+  return transitionHITLStatus(id, 'pending', { status: 'timeout' });
+}
+
+// The human answered but the agent could not be reached
+export function failHITLDelivery(id: number, response: HumanInTheLoopResponse, error: string): HookEvent | null {
+  return transitionHITLStatus(id, 'responded', {
+    status: 'error',
+    respondedAt: response.respondedAt,
+    response,
+    error
+  });
+}
+
+export function getHITLStatus(id: number): HumanInTheLoopStatus | null | undefined {
+  const row = db.prepare('SELECT humanInTheLoopStatus FROM events WHERE id = ?').get(id) as { humanInTheLoopStatus: string | null } | null;
+  if (!row) return undefined;
+  return row.humanInTheLoopStatus ? JSON.parse(row.humanInTheLoopStatus) : null;
+}
+
+// Pending requests, for re-arming timeouts after a restart (served by idx_hitl_pending)
+export function getPendingHITLRequests(): { id: number; timestamp: number; timeout: number | null }[] {
+  return db.prepare(`
+    SELECT id, timestamp, json_extract(humanInTheLoop, '$.timeout') AS timeout
+    FROM events
+    WHERE json_extract(humanInTheLoopStatus, '$.status') = 'pending'
+  `).all() as { id: number; timestamp: number; timeout: number | null }[];
+}
+
 export { db };
\ No newline at end of file
@@ -0,0 +1,327 @@
+import { expireHITLRequest, failHITLDelivery, getPendingHITLRequests } from './db';
+import type { HITLStats, HookEvent, HumanInTheLoopResponse } from './types';
+
+// Delivers human answers to agents and expires requests nobody answered.
+//
+// Delivery: answers are queued and sent in the background over one pooled WebSocket
+// per agent URL. Each message carries a `deliveryId`; an agent confirms it by replying
+// {"type":"ack","deliveryId":...}. Agents written against the original protocol read
+// one message and close the socket instead, so until a connection has acked once,
+// sends on it are serialized and a clean close counts as confirmation. Unconfirmed
+// deliveries are retried with backoff (at-least-once), then marked status 'error'.
+//
+// Timeouts: pending requests sit in a hashed timer wheel keyed by deadline
+// (`humanInTheLoop.timeout` seconds after the event, default 300), so scheduling and
+// cancelling are O(1) and each tick only looks at one slot.
+const ACK_TIMEOUT_MS = parseInt(process.env.HITL_ACK_TIMEOUT_MS || '5000');
+const MAX_ATTEMPTS = parseInt(process.env.HITL_MAX_ATTEMPTS || '5');
+const RETRY_BASE_MS = parseInt(process.env.HITL_RETRY_BASE_MS || '500');
+const IDLE_CLOSE_MS = parseInt(process.env.HITL_IDLE_CLOSE_MS || '30000');
+const DEFAULT_TIMEOUT_SECONDS = 300;
+
+const WHEEL_TICK_MS = 1000;
+const WHEEL_SLOTS = 512;
+
+type Broadcast = (event: HookEvent) => void;
+let broadcast: Broadcast = () => {};
+
+const stats = { delivered: 0, retried: 0, failed: 0, expired: 0 };
+
+// ---------------------------------------------------------------------------
+// Timeout wheel
+
+interface ScheduledTimeout {
+  deadline: number; // ms
+  slot: number; // wheel slot the id was placed in
+}
+
+const wheel: Set<number>[] = Array.from({ length: WHEEL_SLOTS }, () => new Set());
+const deadlines = new Map<number, ScheduledTimeout>(); // event id -> deadline and slot
+let lastTick = Math.floor(Date.now() / WHEEL_TICK_MS);
+
+function scheduleTimeout(id: number, deadline: number): void {
+  cancelTimeout(id);
+  // First tick at or after the deadline, so the slot is never visited while it is still
+  // in the future. A deadline that is already due goes in the next slot tick() visits
+  // rather than its own past slot, which wouldn't be scanned until the wheel came round.
+  const dueTick = Math.max(Math.ceil(deadline / WHEEL_TICK_MS), lastTick + 1);
+  const slot = dueTick % WHEEL_SLOTS;
+  deadlines.set(id, { deadline, slot });
+  wheel[slot]!.add(id);
+}
+
+export function cancelTimeout(id: number): void {
+  const scheduled = deadlines.get(id);
+  if (scheduled === undefined) return;
+  deadlines.delete(id);
+  wheel[scheduled.slot]!.delete(id);
+}
+
+function deadlineFor(timestamp: number | undefined, timeoutSeconds: number | null | undefined): number {
+  return (timestamp ?? Date.now()) + (timeoutSeconds ?? DEFAULT_TIMEOUT_SECONDS) * 1000;
+}
+
+function tick(): void {
+  const now = Date.now();
+  const currentTick = Math.floor(now / WHEEL_TICK_MS);
+
+  // Catch up on ticks missed while the event loop was busy (at most one full turn)
+  const firstTick = Math.max(lastTick + 1, currentTick - WHEEL_SLOTS + 1);
+  for (let t = firstTick; t <= currentTick; t++) {
+    const slot = wheel[t % WHEEL_SLOTS]!;
+    for (const id of slot) {
+      // Entries for later turns of the wheel stay put
+      if (deadlines.get(id)!.deadline > now) continue;
+
+      slot.delete(id);
+      deadlines.delete(id);
+      const event = expireHITLRequest(id);
+      if (event) {
+        stats.expired++;
+        broadcast(event);
+      }
+    }
+  }
+  lastTick = currentTick;
+}
+
+// Arm timeouts for newly committed HITL requests (registered with onEventsCommitted)
+export function trackHITLRequests(events: HookEvent[]): void {
+  for (const event of events) {
+    if (event.id === undefined || !event.humanInTheLoop || event.humanInTheLoopStatus?.status !== 'pending') continue;
+    scheduleTimeout(event.id, deadlineFor(event.timestamp, event.humanInTheLoop.timeout));
+  }
+}
+
+// ---------------------------------------------------------------------------
+// Delivery
+
+interface Delivery {
+  id: number;
+  eventId: number;
+  url: string;
+  response: HumanInTheLoopResponse;
+  message: string;
+  attempts: number;
+}
+
+interface InflightDelivery {
+  resolve: () => void;
+  reject: (error: Error) => void;
+  timer: ReturnType<typeof setTimeout>;
+}
+
+interface AgentConnection {
+  url: string;
+  ws: WebSocket | null;
+  connecting: Promise<WebSocket> | null;
+  supportsAck: boolean;
+  inflight: Map<number, InflightDelivery>;
+  pending: number; // queued + in flight
+  tail: Promise<void>; // serializes sends until the agent has acked once
+  idleTimer: ReturnType<typeof setTimeout> | null;
+}
+
+const connections = new Map<string, AgentConnection>();
+let nextDeliveryId = 1;
+
+function getConnection(url: string): AgentConnection {
+  let connection = connections.get(url);
+  if (!connection) {
+    connection = {
+      url,
+      ws: null,
+      connecting: null,
+      supportsAck: false,
+      inflight: new Map(),
+      pending: 0,
+      tail: Promise.resolve(),
+      idleTimer: null
+    };
+    connections.set(url, connection);
+  }
+  return connection;
+}
+
+function settleInflight(connection: AgentConnection, deliveryId: number, error?: Error): void {
+  const inflight = connection.inflight.get(deliveryId);
+  if (!inflight) return;
+  connection.inflight.delete(deliveryId);
+  clearTimeout(inflight.timer);
+  if (error) {
+    inflight.reject(error);
+  } else {
+    inflight.resolve();
+  }
+}
+
+function openConnection(connection: AgentConnection): Promise<WebSocket> {
+  if (connection.ws && connection.ws.readyState === WebSocket.OPEN) {
+    return Promise.resolve(connection.ws);
+  }
+  if (connection.connecting) return connection.connecting;
+
+  connection.connecting = new Promise<WebSocket>((resolve, reject) => {
+    const ws = new WebSocket(connection.url);
+    const connectTimer = setTimeout(() => {
+      reject(new Error('Timed out connecting to agent'));
+      ws.close();
+    }, ACK_TIMEOUT_MS);
+
+    ws.onopen = () => {
+      clearTimeout(connectTimer);
+      connection.ws = ws;
+      resolve(ws);
+    };
+
+    ws.onmessage = (message) => {
+      try {
+        const data = JSON.parse(String(message.data));
+        if (data?.type === 'ack' && typeof data.deliveryId === 'number') {
+          connection.supportsAck = true;
+          settleInflight(connection, data.deliveryId);
+        }
+      } catch {
+        // Agents may send other traffic on the socket; only acks matter here
+      }
+    };
+
+    ws.onerror = () => {
+      clearTimeout(connectTimer);
+      reject(new Error('Agent connection error'));
+    };
+
+    ws.onclose = (event) => {
+      clearTimeout(connectTimer);
+      if (connection.ws === ws) connection.ws = null;
+      // Original-protocol agents close cleanly once they have read the answer
+      const legacyAck = !connection.supportsAck && (event.code === 1000 || event.code === 1005);
+      for (const deliveryId of Array.from(connection.inflight.keys())) {
+        settleInflight(connection, deliveryId, legacyAck ? undefined : new Error(`Agent connection closed (${event.code})`));
+      }
+      reject(new Error(`Agent connection closed (${event.code})`));
+    };
+  }).finally(() => {
+    connection.connecting = null;
+  });
+
+  return connection.connecting;
+}
+
+async function sendOnce(connection: AgentConnection, delivery: Delivery): Promise<void> {
+  const ws = await openConnection(connection);
+
+  return new Promise<void>((resolve, reject) => {
+    const timer = setTimeout(() => {
+      settleInflight(connection, delivery.id, new Error('No ack from agent'));
+      // The socket may be wedged; start over with a fresh one on retry
+      ws.close();
+    }, ACK_TIMEOUT_MS);
+    connection.inflight.set(delivery.id, { resolve, reject, timer });
+
+    try {
+      ws.send(delivery.message);
+    } catch (error) {
+      settleInflight(connection, delivery.id, error instanceof Error ? error : new Error(String(error)));
+    }
+  });
+}
+
+function scheduleIdleClose(connection: AgentConnection): void {
+  if (connection.idleTimer) clearTimeout(connection.idleTimer);
+  connection.idleTimer = setTimeout(() => {
+    connection.idleTimer = null;
+    if (connection.pending > 0) return;
+    connection.ws?.close(1000);
+    connections.delete(connection.url);
+  }, IDLE_CLOSE_MS);
+}
+
+async function deliver(delivery: Delivery): Promise<void> {
+  const connection = getConnection(delivery.url);
+  connection.pending++;
+  if (connection.idleTimer) {
+    clearTimeout(connection.idleTimer);
+    connection.idleTimer = null;
+  }
+
+  try {
+    if (connection.supportsAck) {
+      await sendOnce(connection, delivery);
+    } else {
+      const send = () => sendOnce(connection, delivery);
+      const result = connection.tail.then(send, send);
+      connection.tail = result.catch(() => {});
+      await result;
+    }
+  } finally {
+    connection.pending--;
+    if (connection.pending === 0) scheduleIdleClose(connection);
+  }
+}
+
+function attempt(delivery: Delivery): void {
+  delivery.attempts++;
+  deliver(delivery).then(
+    () => {
+      stats.delivered++;
+    },
+    (error: Error) => {
+      if (delivery.attempts < MAX_ATTEMPTS) {
+        stats.retried++;
+        setTimeout(() => attempt(delivery), RETRY_BASE_MS * 2 ** (delivery.attempts - 1));
+        return;
+      }
+
+      stats.failed++;
+      console.error(`[HITL] Giving up on event ${delivery.eventId} after ${delivery.attempts} attempts:`, error.message);
+      const event = failHITLDelivery(delivery.eventId, delivery.response, error.message);
+      if (event) broadcast(event);
+    }
+  );
+}
+
+// Queue an answer for delivery and return immediately
+export function dispatchHITLResponse(event: HookEvent, response: HumanInTheLoopResponse): void {
+  if (event.id !== undefined) cancelTimeout(event.id);
+
+  const url = event.humanInTheLoop?.responseWebSocketUrl;
+  if (!url || event.id === undefined) return;
+
+  const id = nextDeliveryId++;
+  attempt({
+    id,
+    eventId: event.id,
+    url,
+    response,
+    message: JSON.stringify({ ...response, deliveryId: id }),
+    attempts: 0
+  });
+}
+
+// ---------------------------------------------------------------------------
+
+export function startHITLDispatcher(onStatusChange: Broadcast): void {
+  broadcast = onStatusChange;
+
+  // Re-arm timeouts for requests still pending from before a restart; overdue ones expire on the first tick
+  for (const request of getPendingHITLRequests()) {
+    scheduleTimeout(request.id, deadlineFor(request.timestamp, request.timeout));
+  }
+
+  setInterval(tick, WHEEL_TICK_MS);
+}
+
+export function getHITLStats(): HITLStats {
+  let queued = 0;
+  connections.forEach(connection => {
+    queued += connection.pending;
+  });
+
+  return {
+    ...stats,
+    pendingRequests: deadlines.size,
+    queuedDeliveries: queued,
+    connections: connections.size
+  };
+}
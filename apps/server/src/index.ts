@@ -1,5 +1,20 @@
-import { initDatabase, insertEvent, getFilterOptions, getRecentEvents, updateEventHITLResponse } from './db';
-import type { HookEvent, HumanInTheLoopResponse } from './types';
+import { initDatabase, getFilterOptions, getRecentEvents, getSessionChat, queryEvents, parseEventCursor, searchEvents, updateEventHITLResponse, getHITLStatus } from './db';
+import { enqueueEvent, onEventsCommitted, parseEventBatch, validateEvent } from './ingest';
+import {
+  addStreamClient,
+  removeStreamClient,
+  broadcastEvent,
+  broadcastEvents,
+  broadcastMetrics,
+  drainStreamClient,
+  handleStreamMessage,
+  setStreamHistory,
+  getStreamStats
+} from './stream';
+import { startMaintenance, runMaintenance, getMaintenanceStatus } from './maintenance';
+import { seedMetrics, recordEvents, startMetricsPush, getTimeseries, TIME_RANGES } from './metrics';
+import { startHITLDispatcher, trackHITLRequests, dispatchHITLResponse, getHITLStats } from './hitl';
+import type { EventCursor, HookEvent, HumanInTheLoopResponse } from './types';
 import { 
   createTheme, 
   updateThemeById, 
@@ -14,91 +29,47 @@ import {
 // Initialize database
 initDatabase();
 
-// Store WebSocket clients
-const wsClients = new Set<any>();
+// Schedule retention, compression and vacuum
+startMaintenance();
 
-// Helper function to send response to agent via WebSocket
-async function sendResponseToAgent(
-  wsUrl: string,
-  response: HumanInTheLoopResponse
-): Promise<void> {
-  console.log(`[HITL] Connecting to agent WebSocket: ${wsUrl}`);
+// Broadcast every committed ingest batch to subscribed WebSocket clients
+onEventsCommitted(broadcastEvents);
+// New /stream clients start from the 50 most recent events
+setStreamHistory(() => getRecentEvents(50));
 
-  return new Promise((resolve, reject) => {
-    let ws: WebSocket | null = null;
-    let isResolved = false;
+// Pulse chart aggregates: seed from recent history, then count every committed event
+const seededEvents = seedMetrics();
+onEventsCommitted(recordEvents);
+startMetricsPush(broadcastMetrics);
 
-    const cleanup = () => {
-      if (ws) {
-        try {
-          ws.close();
-        } catch (e) {
-          // Ignore close errors
-        }
-      }
-    };
-
-    try {
-      ws = new WebSocket(wsUrl);
-
-      ws.onopen = () => {
-        if (isResolved) return;
-        console.log('[HITL] WebSocket connection opened, sending response...');
-
-        try {
-          ws!.send(JSON.stringify(response));
-          console.log('[HITL] Response sent successfully');
-
-          // Wait longer to ensure message fully transmits before closing
-          setTimeout(() => {
-            cleanup();
-            if (!isResolved) {
-              isResolved = true;
-              resolve();
-            }
-          }, 500);
-        } catch (error) {
-          console.error('[HITL] Error sending message:', error);
-          cleanup();
-          if (!isResolved) {
-            isResolved = true;
-            reject(error);
-          }
-        }
-      };
-
-      ws.onerror = (error) => {
-        console.error('[HITL] WebSocket error:', error);
-        cleanup();
-        if (!isResolved) {
-          isResolved = true;
-          reject(error);
-        }
-      };
+// Deliver HITL answers to agents in the background and time out unanswered requests
+startHITLDispatcher(broadcastEvent);
+onEventsCommitted(trackHITLRequests);
 
-      ws.onclose = () => {
-        console.log('[HITL] WebSocket connection closed');
-      };
+// Multi-valued query params accept repeated params or comma-separated values
+function getListParam(params: URLSearchParams, name: string): string[] | undefined {
+  const values = params.getAll(name).flatMap(v => v.split(',')).map(v => v.trim()).filter(Boolean);
+  return values.length > 0 ? values : undefined;
+}
 
-      // Timeout after 5 seconds
-      setTimeout(() => {
-        if (!isResolved) {
-          console.error('[HITL] Timeout sending response to agent');
-          cleanup();
-          isResolved = true;
-          reject(new Error('Timeout sending response to agent'));
-        }
-      }, 5000);
+// Missing or empty parameters are undefined; anything else must be an integer
+function getIntParam(params: URLSearchParams, name: string): number | undefined {
+  const value = params.get(name)?.trim();
+  if (!value) return undefined;
+  if (!/^-?\d+$/.test(value)) {
+    throw new Error(`${name} must be an integer`);
+  }
+  return parseInt(value);
+}
 
-    } catch (error) {
-      console.error('[HITL] Error creating WebSocket:', error);
-      cleanup();
-      if (!isResolved) {
-        isResolved = true;
-        reject(error);
-      }
-    }
-  });
+function getCursorParam(params: URLSearchParams, name: string): EventCursor | undefined {
+  const value = params.get(name)?.trim();
+  if (!value) return undefined;
+  const cursor = parseEventCursor(value);
+  if (!cursor) {
+    throw new Error(`${name} must be a cursor returned by a previous page`);
+  }
+  return cursor;
 }
 
 // Create Bun server with HTTP and WebSocket support
@@ -126,26 +97,16 @@ const server = Bun.serve({
         const event: HookEvent = await req.json();
         
         // Validate required fields
-        if (!event.source_app || !event.session_id || !event.hook_event_type || !event.payload) {
-          return new Response(JSON.stringify({ error: 'Missing required fields' }), {
+        const validationError = validateEvent(event);
+        if (validationError) {
+          return new Response(JSON.stringify({ error: validationError }), {
             status: 400,
             headers: { ...headers, 'Content-Type': 'application/json' }
           });
         }
         
-        // Insert event into database
-        const savedEvent = insertEvent(event);
-        
-        // Broadcast to all WebSocket clients
-        const message = JSON.stringify({ type: 'event', data: savedEvent });
-        wsClients.forEach(client => {
-          try {
-            client.send(message);
-          } catch (err) {
-            // Client disconnected, remove from set
-            wsClients.delete(client);
-          }
-        });
+        // Queue for the next group commit; broadcast happens once the batch is written
+        const savedEvent = await enqueueEvent(event);
         
         return new Response(JSON.stringify(savedEvent), {
           headers: { ...headers, 'Content-Type': 'application/json' }
@@ -159,6 +120,52 @@ const server = Bun.serve({
       }
     }
     
+    // POST /events/batch - Receive many events as a JSON array or NDJSON
+    if (url.pathname === '/events/batch' && req.method === 'POST') {
+      let items: any[];
+      try {
+        items = parseEventBatch(await req.text());
+      } catch (error) {
+        return new Response(JSON.stringify({ error: 'Invalid batch body' }), {
+          status: 400,
+          headers: { ...headers, 'Content-Type': 'application/json' }
+        });
+      }
+
+      const results: { index: number; id?: number; error?: string }[] = [];
+      const valid: { index: number; event: HookEvent }[] = [];
+      items.forEach((item, index) => {
+        const validationError = validateEvent(item);
+        if (validationError) {
+          results[index] = { index, error: validationError };
+        } else {
+          valid.push({ index, event: item });
+        }
+      });
+
+      // Settle individually: an event that fails to store doesn't fail its neighbours
+      const outcomes = await Promise.allSettled(valid.map(v => enqueueEvent(v.event)));
+      let accepted = 0;
+      outcomes.forEach((outcome, i) => {
+        const index = valid[i]!.index;
+        if (outcome.status === 'fulfilled') {
+          accepted++;
+          results[index] = { index, id: outcome.value.id };
+        } else {
+          console.error(`Error storing event ${index} of batch:`, outcome.reason);
+          results[index] = { index, error: 'Failed to store event' };
+        }
+      });
+
+      return new Response(JSON.stringify({
+        accepted,
+        rejected: items.length - accepted,
+        results
+      }), {
+        headers: { ...headers, 'Content-Type': 'application/json' }
+      });
+    }
+    
     // GET /events/filter-options - Get available filter options
     if (url.pathname === '/events/filter-options' && req.method === 'GET') {
       const options = getFilterOptions();
@@ -176,6 +183,85 @@ const server = Bun.serve({
       });
     }
 
+    // GET /events/query - Filtered, keyset-paginated event history
+    if (url.pathname === '/events/query' && req.method === 'GET') {
+      const list = (name: string) => getListParam(url.searchParams, name);
+      const int = (name: string) => getIntParam(url.searchParams, name);
+      const cursor = (name: string) => getCursorParam(url.searchParams, name);
+      const include = list('include') || [];
+
+      try {
+        const result = queryEvents({
+          source_apps: list('source_app'),
+          session_ids: list('session_id'),
+          hook_event_types: list('hook_event_type'),
+          model_names: list('model_name'),
+          since: int('since'),
+          until: int('until'),
+          before: cursor('before'),
+          after: cursor('after'),
+          limit: int('limit'),
+          includePayload: include.includes('payload'),
+          includeChat: include.includes('chat')
+        });
+        return new Response(JSON.stringify(result), {
+          headers: { ...headers, 'Content-Type': 'application/json' }
+        });
+      } catch (error) {
+        return new Response(JSON.stringify({ error: error instanceof Error ? error.message : 'Invalid event query' }), {
+          status: 400,
+          headers: { ...headers, 'Content-Type': 'application/json' }
+        });
+      }
+    }
+
+    // GET /events/search - Ranked full-text search with highlighted snippets
+    if (url.pathname === '/events/search' && req.method === 'GET') {
+      const q = url.searchParams.get('q') || '';
+      if (!q.trim()) {
+        return new Response(JSON.stringify({ error: 'Query parameter q is required' }), {
+          status: 400,
+          headers: { ...headers, 'Content-Type': 'application/json' }
+        });
+      }
+
+      try {
+        const result = searchEvents({
+          q,
+          source_apps: getListParam(url.searchParams, 'source_app'),
+          session_ids: getListParam(url.searchParams, 'session_id'),
+          hook_event_types: getListParam(url.searchParams, 'hook_event_type'),
+          limit: getIntParam(url.searchParams, 'limit'),
+          offset: getIntParam(url.searchParams, 'offset')
+        });
+        return new Response(JSON.stringify(result), {
+          headers: { ...headers, 'Content-Type': 'application/json' }
+        });
+      } catch (error) {
+        console.error('Error searching events:', error);
+        return new Response(JSON.stringify({ error: 'Invalid search query' }), {
+          status: 400,
+          headers: { ...headers, 'Content-Type': 'application/json' }
+        });
+      }
+    }
+
+    // GET /sessions/:id/chat - Reassembled chat transcript from stored deltas
+    if (url.pathname.match(/^\/sessions\/[^\/]+\/chat$/) && req.method === 'GET') {
+      const sessionId = decodeURIComponent(url.pathname.split('/')[2]!);
+      try {
+        const chat = getSessionChat(sessionId, getIntParam(url.searchParams, 'upto'));
+        return new Response(JSON.stringify(chat), {
+          headers: { ...headers, 'Content-Type': 'application/json' }
+        });
+      } catch (error) {
+        return new Response(JSON.stringify({ error: error instanceof Error ? error.message : 'Invalid chat query' }), {
+          status: 400,
+          headers: { ...headers, 'Content-Type': 'application/json' }
+        });
+      }
+    }
+
     // POST /events/:id/respond - Respond to HITL request
     if (url.pathname.match(/^\/events\/\d+\/respond$/) && req.method === 'POST') {
       const id = parseInt(url.pathname.split('/')[2]);
@@ -184,38 +270,28 @@ const server = Bun.serve({
         const response: HumanInTheLoopResponse = await req.json();
         response.respondedAt = Date.now();
 
-        // Update event in database
+        // Update event in database (only while the request is still pending)
         const updatedEvent = updateEventHITLResponse(id, response);
 
         if (!updatedEvent) {
-          return new Response(JSON.stringify({ error: 'Event not found' }), {
-            status: 404,
+          const status = getHITLStatus(id);
+          if (status === undefined) {
+            return new Response(JSON.stringify({ error: 'Event not found' }), {
+              status: 404,
+              headers: { ...headers, 'Content-Type': 'application/json' }
+            });
+          }
+          return new Response(JSON.stringify({ error: `Request is not pending (status: ${status?.status ?? 'none'})` }), {
+            status: 409,
             headers: { ...headers, 'Content-Type': 'application/json' }
           });
         }
 
-        // Send response to agent via WebSocket
-        if (updatedEvent.humanInTheLoop?.responseWebSocketUrl) {
-          try {
-            await sendResponseToAgent(
-              updatedEvent.humanInTheLoop.responseWebSocketUrl,
-              response
-            );
-          } catch (error) {
-            console.error('Failed to send response to agent:', error);
-            // Don't fail the request if we can't reach the agent
-          }
-        }
+        // Queue delivery to the agent; failures are retried and surface as status 'error'
+        dispatchHITLResponse(updatedEvent, response);
 
-        // Broadcast updated event to all connected clients
-        const message = JSON.stringify({ type: 'event', data: updatedEvent });
-        wsClients.forEach(client => {
-          try {
-            client.send(message);
-          } catch (err) {
-            wsClients.delete(client);
-          }
-        });
+        // Broadcast updated event to subscribed clients
+        broadcastEvent(updatedEvent);
 
         return new Response(JSON.stringify(updatedEvent), {
           headers: { ...headers, 'Content-Type': 'application/json' }
@@ -405,6 +481,66 @@ const server = Bun.serve({
       });
     }
     
+    // GET /admin/db - Database size, row counts and last maintenance report
+    if (url.pathname === '/admin/db' && req.method === 'GET') {
+      return new Response(JSON.stringify(getMaintenanceStatus()), {
+        headers: { ...headers, 'Content-Type': 'application/json' }
+      });
+    }
+    
+    // POST /admin/maintenance - Run maintenance now
+    // ?vacuum=full also runs the one-time full VACUUM that enables incremental vacuum
+    if (url.pathname === '/admin/maintenance' && req.method === 'POST') {
+      try {
+        const report = await runMaintenance({ fullVacuum: url.searchParams.get('vacuum') === 'full' });
+        return new Response(JSON.stringify(report), {
+          headers: { ...headers, 'Content-Type': 'application/json' }
+        });
+      } catch (error) {
+        return new Response(JSON.stringify({ error: error instanceof Error ? error.message : 'Maintenance failed' }), {
+          status: 409,
+          headers: { ...headers, 'Content-Type': 'application/json' }
+        });
+      }
+    }
+    
+    // GET /metrics/timeseries - Bucketed event counts for the pulse charts
+    // ?range=1m|3m|5m|10m (or ?resolution=<ms>&points=<n>), optional source_app, session_id (or prefix), hook_event_type
+    if (url.pathname === '/metrics/timeseries' && req.method === 'GET') {
+      const range = TIME_RANGES[url.searchParams.get('range') || '1m'];
+      try {
+        const result = getTimeseries({
+          resolution: getIntParam(url.searchParams, 'resolution') ?? range?.resolution ?? 0,
+          points: getIntParam(url.searchParams, 'points') ?? range?.points ?? 60,
+          source_app: url.searchParams.get('source_app') || undefined,
+          session_id: url.searchParams.get('session_id') || undefined,
+          hook_event_type: url.searchParams.get('hook_event_type') || undefined
+        });
+        return new Response(JSON.stringify(result), {
+          headers: { ...headers, 'Content-Type': 'application/json' }
+        });
+      } catch (error) {
+        return new Response(JSON.stringify({ error: error instanceof Error ? error.message : 'Invalid timeseries query' }), {
+          status: 400,
+          headers: { ...headers, 'Content-Type': 'application/json' }
+        });
+      }
+    }
+    
+    // GET /hitl/stats - Delivery counters, pending timeouts and pooled agent connections
+    if (url.pathname === '/hitl/stats' && req.method === 'GET') {
+      return new Response(JSON.stringify(getHITLStats()), {
+        headers: { ...headers, 'Content-Type': 'application/json' }
+      });
+    }
+    
+    // GET /stream/stats - Per-client send queue and lag stats
+    if (url.pathname === '/stream/stats' && req.method === 'GET') {
+      return new Response(JSON.stringify(getStreamStats()), {
+        headers: { ...headers, 'Content-Type': 'application/json' }
+      });
+    }
+    
     // WebSocket upgrade
     if (url.pathname === '/stream') {
       const success = server.upgrade(req);
@@ -422,30 +558,33 @@ const server = Bun.serve({
   websocket: {
     open(ws) {
       console.log('WebSocket client connected');
-      wsClients.add(ws);
-      
-      // Send recent events on connection
-      const events = getRecentEvents(50);
-      ws.send(JSON.stringify({ type: 'initial', data: events }));
+      // Recent events follow once the client has subscribed (or after a short grace period)
+      addStreamClient(ws);
     },
     
     message(ws, message) {
-      // Handle any client messages if needed
-      console.log('Received message:', message);
+      // Control messages, e.g. {"type":"subscribe","data":{"source_apps":["my-app"],"projection":"summary"}}
+      handleStreamMessage(ws, message);
+    },
+    
+    drain(ws) {
+      drainStreamClient(ws);
     },
     
     close(ws) {
       console.log('WebSocket client disconnected');
-      wsClients.delete(ws);
+      removeStreamClient(ws);
     },
     
     error(ws, error) {
       console.error('WebSocket error:', error);
-      wsClients.delete(ws);
+      removeStreamClient(ws);
     }
   }
 });
 
 console.log(`🚀 Server running on http://localhost:${server.port}`);
 console.log(`📊 WebSocket endpoint: ws://localhost:${server.port}/stream`);
-console.log(`📮 POST events to: http://localhost:${server.port}/events`);
\ No newline at end of file
+console.log(`📮 POST events to: http://localhost:${server.port}/events`);
+console.log(`📦 POST event batches to: http://localhost:${server.port}/events/batch`);
+console.log(`📈 Pulse metrics seeded with ${seededEvents} recent events: http://localhost:${server.port}/metrics/timeseries`);
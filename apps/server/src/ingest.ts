@@ -0,0 +1,134 @@
+import { insertEvents } from './db';
+import type { HookEvent } from './types';
+
+// Group-commit writer: events from concurrent requests are queued and written
+// in a single transaction once FLUSH_MAX_ROWS are pending or FLUSH_INTERVAL_MS
+// has elapsed, so a burst of hook events costs one WAL commit instead of one each.
+const FLUSH_MAX_ROWS = parseInt(process.env.INGEST_FLUSH_MAX_ROWS || '256');
+const FLUSH_INTERVAL_MS = parseInt(process.env.INGEST_FLUSH_INTERVAL_MS || '5');
+
+interface PendingEvent {
+  event: HookEvent;
+  resolve: (saved: HookEvent) => void;
+  reject: (error: unknown) => void;
+}
+
+type CommitListener = (events: HookEvent[]) => void;
+
+let pending: PendingEvent[] = [];
+let flushTimer: ReturnType<typeof setTimeout> | null = null;
+const commitListeners: CommitListener[] = [];
+
+export function validateEvent(event: any): string | null {
+  if (!event || typeof event !== 'object') {
+    return 'Event must be a JSON object';
+  }
+  if (!event.source_app || !event.session_id || !event.hook_event_type || !event.payload) {
+    return 'Missing required fields';
+  }
+  // Anything that can't be bound to its column would otherwise fail the whole group commit
+  for (const field of ['source_app', 'session_id', 'hook_event_type'] as const) {
+    if (typeof event[field] !== 'string') return `${field} must be a string`;
+  }
+  for (const field of ['summary', 'model_name'] as const) {
+    if (event[field] != null && typeof event[field] !== 'string') return `${field} must be a string`;
+  }
+  for (const field of ['timestamp', 'chat_message_count', 'chat_offset'] as const) {
+    if (event[field] != null && !Number.isFinite(event[field])) return `${field} must be a number`;
+  }
+  for (const field of ['chat', 'chat_delta'] as const) {
+    if (event[field] != null && !Array.isArray(event[field])) return `${field} must be an array`;
+  }
+  if (event.humanInTheLoop != null && typeof event.humanInTheLoop !== 'object') {
+    return 'humanInTheLoop must be an object';
+  }
+  return null;
+}
+
+// Register a callback that receives every committed batch (used for broadcasting)
+export function onEventsCommitted(listener: CommitListener): void {
+  commitListeners.push(listener);
+}
+
+export function flushPendingEvents(): void {
+  if (flushTimer) {
+    clearTimeout(flushTimer);
+    flushTimer = null;
+  }
+  if (pending.length === 0) return;
+
+  const batch = pending;
+  pending = [];
+
+  let saved: HookEvent[];
+  try {
+    saved = insertEvents(batch.map(item => item.event));
+    batch.forEach((item, index) => item.resolve(saved[index]!));
+  } catch (error) {
+    console.error(`[ingest] Failed to commit batch of ${batch.length} events, retrying one at a time:`, error);
+    saved = commitIndividually(batch);
+  }
+  if (saved.length === 0) return;
+
+  for (const listener of commitListeners) {
+    try {
+      listener(saved);
+    } catch (error) {
+      console.error('[ingest] Commit listener failed:', error);
+    }
+  }
+}
+
+// Fallback after a failed group commit, so one bad event only fails its own request
+function commitIndividually(batch: PendingEvent[]): HookEvent[] {
+  const saved: HookEvent[] = [];
+  for (const item of batch) {
+    try {
+      const [event] = insertEvents([item.event]);
+      saved.push(event!);
+      item.resolve(event!);
+    } catch (error) {
+      item.reject(error);
+    }
+  }
+  return saved;
+}
+
+export function enqueueEvent(event: HookEvent): Promise<HookEvent> {
+  return new Promise((resolve, reject) => {
+    pending.push({ event, resolve, reject });
+
+    if (pending.length >= FLUSH_MAX_ROWS || FLUSH_INTERVAL_MS <= 0) {
+      flushPendingEvents();
+    } else if (!flushTimer) {
+      flushTimer = setTimeout(flushPendingEvents, FLUSH_INTERVAL_MS);
+    }
+  });
+}
+
+// Parse a batch body: either a JSON array or NDJSON (one event per line).
+// Unparseable NDJSON lines come back as null so they can be reported per index.
+export function parseEventBatch(body: string): any[] {
+  const trimmed = body.trim();
+  if (!trimmed) return [];
+
+  if (trimmed.startsWith('[')) {
+    const parsed = JSON.parse(trimmed);
+    if (!Array.isArray(parsed)) {
+      throw new Error('Batch body must be a JSON array');
+    }
+    return parsed;
+  }
+
+  return trimmed
+    .split('\n')
+    .map(line => line.trim())
+    .filter(line => line.length > 0)
+    .map(line => {
+      try {
+        return JSON.parse(line);
+      } catch {
+        return null;
+      }
+    });
+}
@@ -0,0 +1,161 @@
+import {
+  getEventGroups,
+  expireEvents,
+  compressEventsBefore,
+  compactMinuteRollups,
+  incrementalVacuum,
+  enableIncrementalVacuum,
+  getDatabaseStats
+} from './db';
+import type { DatabaseStats, MaintenanceReport, RetentionRule } from './types';
+
+// Background maintenance for events.db: retention (with per-minute rollups of what
+// is removed), compression of old payload/chat blobs, rollup compaction and
+// incremental vacuum. All thresholds come from the environment; 0 disables a step.
+const DAY_MS = 24 * 60 * 60 * 1000;
+const HOUR_MS = 60 * 60 * 1000;
+
+const RETENTION_DAYS = parseFloat(process.env.RETENTION_DAYS || '0');
+const COMPRESS_AFTER_HOURS = parseFloat(process.env.COMPRESS_AFTER_HOURS || '24');
+const ROLLUP_MINUTE_RETENTION_DAYS = parseFloat(process.env.ROLLUP_MINUTE_RETENTION_DAYS || '90');
+const MAINTENANCE_INTERVAL_MINUTES = parseFloat(process.env.MAINTENANCE_INTERVAL_MINUTES || '60');
+
+// e.g. RETENTION_RULES='[{"hook_event_type":"PostToolUse","days":7},{"source_app":"prod-agent","days":90}]'
+function parseRetentionRules(): RetentionRule[] {
+  if (!process.env.RETENTION_RULES) return [];
+  try {
+    const rules = JSON.parse(process.env.RETENTION_RULES);
+    if (!Array.isArray(rules)) throw new Error('RETENTION_RULES must be a JSON array');
+    return rules.filter((rule: any) => typeof rule?.days === 'number');
+  } catch (error) {
+    console.error('[maintenance] Ignoring invalid RETENTION_RULES:', error);
+    return [];
+  }
+}
+
+const retentionRules = parseRetentionRules();
+
+let lastReport: MaintenanceReport | null = null;
+let nextRunAt: number | null = null;
+let running = false;
+
+// Most specific matching rule wins; falls back to RETENTION_DAYS
+export function getRetentionDays(sourceApp: string, hookEventType: string): number {
+  let best: RetentionRule | null = null;
+  let bestScore = -1;
+
+  for (const rule of retentionRules) {
+    if (rule.source_app && rule.source_app !== sourceApp) continue;
+    if (rule.hook_event_type && rule.hook_event_type !== hookEventType) continue;
+    const score = (rule.source_app ? 2 : 0) + (rule.hook_event_type ? 1 : 0);
+    if (score > bestScore) {
+      best = rule;
+      bestScore = score;
+    }
+  }
+
+  return best ? best.days : RETENTION_DAYS;
+}
+
+// Yield to the event loop between steps too (expiry and compression also yield per chunk)
+const yieldToEventLoop = () => new Promise(resolve => setTimeout(resolve, 0));
+
+// `fullVacuum` does the one-time VACUUM that enables incremental vacuum on an older database
+export async function runMaintenance(options: { fullVacuum?: boolean } = {}): Promise<MaintenanceReport> {
+  if (running) {
+    throw new Error('Maintenance is already running');
+  }
+  running = true;
+
+  const startedAt = Date.now();
+  const report: MaintenanceReport = {
+    startedAt,
+    durationMs: 0,
+    expiredEvents: 0,
+    compressedEvents: 0,
+    compressedBytesSaved: 0,
+    compactedRollups: 0,
+    reclaimedBytes: 0
+  };
+
+  try {
+    for (const group of getEventGroups()) {
+      const days = getRetentionDays(group.source_app, group.hook_event_type);
+      if (days > 0) {
+        report.expiredEvents += await expireEvents(group.source_app, group.hook_event_type, startedAt - days * DAY_MS);
+        await yieldToEventLoop();
+      }
+    }
+
+    if (COMPRESS_AFTER_HOURS > 0) {
+      const compressed = await compressEventsBefore(startedAt - COMPRESS_AFTER_HOURS * HOUR_MS);
+      report.compressedEvents = compressed.events;
+      report.compressedBytesSaved = compressed.bytesSaved;
+      await yieldToEventLoop();
+    }
+
+    if (ROLLUP_MINUTE_RETENTION_DAYS > 0) {
+      report.compactedRollups = compactMinuteRollups(startedAt - ROLLUP_MINUTE_RETENTION_DAYS * DAY_MS);
+      await yieldToEventLoop();
+    }
+
+    report.reclaimedBytes = options.fullVacuum ? enableIncrementalVacuum() : 0;
+    report.reclaimedBytes += incrementalVacuum();
+  } catch (error) {
+    console.error('[maintenance] Run failed:', error);
+    report.error = error instanceof Error ? error.message : String(error);
+  } finally {
+    running = false;
+  }
+
+  report.durationMs = Date.now() - startedAt;
+  lastReport = report;
+  console.log(`[maintenance] expired=${report.expiredEvents} compressed=${report.compressedEvents} reclaimed=${report.reclaimedBytes}B in ${report.durationMs}ms`);
+  return report;
+}
+
+export function startMaintenance(): void {
+  if (MAINTENANCE_INTERVAL_MINUTES <= 0) return;
+
+  const intervalMs = MAINTENANCE_INTERVAL_MINUTES * 60 * 1000;
+  const schedule = () => {
+    nextRunAt = Date.now() + intervalMs;
+    setTimeout(async () => {
+      try {
+        await runMaintenance();
+      } catch (error) {
+        console.error('[maintenance] Scheduled run skipped:', error);
+      }
+      schedule();
+    }, intervalMs);
+  };
+  schedule();
+}
+
+export function getMaintenanceStatus(): {
+  stats: DatabaseStats;
+  lastReport: MaintenanceReport | null;
+  nextRunAt: number | null;
+  running: boolean;
+  config: {
+    retentionDays: number;
+    retentionRules: RetentionRule[];
+    compressAfterHours: number;
+    rollupMinuteRetentionDays: number;
+    intervalMinutes: number;
+  };
+} {
+  return {
+    stats: getDatabaseStats(),
+    lastReport,
+    nextRunAt,
+    running,
+    config: {
+      retentionDays: RETENTION_DAYS,
+      retentionRules,
+      compressAfterHours: COMPRESS_AFTER_HOURS,
+      rollupMinuteRetentionDays: ROLLUP_MINUTE_RETENTION_DAYS,
+      intervalMinutes: MAINTENANCE_INTERVAL_MINUTES
+    }
+  };
+}
@@ -0,0 +1,202 @@
+import { getEventCountsSince } from './db';
+import type { EventCountRow, HookEvent, MetricsDelta, TimeseriesPoint, TimeseriesQuery, TimeseriesResult } from './types';
+
+// In-memory aggregates behind the pulse charts. There is one ring buffer per
+// resolution, indexed by floor(timestamp / resolution) % capacity, so recording an
+// event is O(1) per resolution and reading a series never touches SQLite. Each
+// bucket also keeps per-agent (source_app + session_id) counts so filtered series
+// can be served from the same buckets.
+//
+// Committed events are staged in `pending` and folded into the rings on each push
+// tick, so a /metrics/timeseries snapshot always corresponds exactly to a delta
+// sequence number and clients can apply later deltas without double counting.
+export const METRICS_RESOLUTIONS = [1000, 3000, 5000, 10000];
+const BUCKETS_PER_RESOLUTION = parseInt(process.env.METRICS_BUCKETS || '360');
+const PUSH_INTERVAL_MS = parseInt(process.env.METRICS_PUSH_INTERVAL_MS || '1000');
+
+// The client's time ranges: 60 bars each
+export const TIME_RANGES: Record<string, { resolution: number; points: number }> = {
+  '1m': { resolution: 1000, points: 60 },
+  '3m': { resolution: 3000, points: 60 },
+  '5m': { resolution: 5000, points: 60 },
+  '10m': { resolution: 10000, points: 60 }
+};
+
+// Pseudo event types the client never charts
+const IGNORED_EVENT_TYPES = new Set(['refresh', 'initial']);
+
+interface AgentCounts {
+  source_app: string;
+  session_id: string;
+  count: number;
+  eventTypes: Record<string, number>;
+}
+
+interface Bucket {
+  start: number;
+  count: number;
+  eventTypes: Record<string, number>;
+  sessions: Record<string, number>;
+  sourceApps: Record<string, number>;
+  agents: Map<string, AgentCounts>;
+}
+
+interface Ring {
+  resolution: number;
+  buckets: (Bucket | undefined)[];
+}
+
+const rings: Ring[] = METRICS_RESOLUTIONS.map(resolution => ({
+  resolution,
+  buckets: new Array(BUCKETS_PER_RESOLUTION)
+}));
+
+let seq = 0;
+let pending = new Map<string, EventCountRow>();
+
+function increment(record: Record<string, number>, key: string, by: number): void {
+  record[key] = (record[key] || 0) + by;
+}
+
+function addToRing(ring: Ring, row: EventCountRow): void {
+  const slot = Math.floor(row.bucket / ring.resolution);
+  const start = slot * ring.resolution;
+  const index = slot % BUCKETS_PER_RESOLUTION;
+
+  let bucket = ring.buckets[index];
+  if (!bucket || bucket.start !== start) {
+    // The slot holds a newer bucket: this row fell out of the window
+    if (bucket && bucket.start > start) return;
+    bucket = { start, count: 0, eventTypes: {}, sessions: {}, sourceApps: {}, agents: new Map() };
+    ring.buckets[index] = bucket;
+  }
+
+  bucket.count += row.count;
+  increment(bucket.eventTypes, row.hook_event_type, row.count);
+  increment(bucket.sessions, row.session_id, row.count);
+  increment(bucket.sourceApps, row.source_app, row.count);
+
+  const agentKey = `${row.source_app}\u0000${row.session_id}`;
+  let agent = bucket.agents.get(agentKey);
+  if (!agent) {
+    agent = { source_app: row.source_app, session_id: row.session_id, count: 0, eventTypes: {} };
+    bucket.agents.set(agentKey, agent);
+  }
+  agent.count += row.count;
+  increment(agent.eventTypes, row.hook_event_type, row.count);
+}
+
+function addRow(row: EventCountRow): void {
+  for (const ring of rings) {
+    addToRing(ring, row);
+  }
+}
+
+// Load recent history from SQLite so charts have data immediately after a restart
+export function seedMetrics(): number {
+  const window = Math.max(...METRICS_RESOLUTIONS) * BUCKETS_PER_RESOLUTION;
+  const rows = getEventCountsSince(Date.now() - window);
+  let events = 0;
+  for (const row of rows) {
+    if (IGNORED_EVENT_TYPES.has(row.hook_event_type)) continue;
+    addRow(row);
+    events += row.count;
+  }
+  return events;
+}
+
+// Stage committed events; they reach the rings (and clients) on the next push tick
+export function recordEvents(events: HookEvent[]): void {
+  for (const event of events) {
+    if (IGNORED_EVENT_TYPES.has(event.hook_event_type)) continue;
+
+    const bucket = Math.floor((event.timestamp ?? Date.now()) / 1000) * 1000;
+    const key = `${bucket}\u0000${event.source_app}\u0000${event.session_id}\u0000${event.hook_event_type}`;
+    const row = pending.get(key);
+    if (row) {
+      row.count++;
+    } else {
+      pending.set(key, {
+        bucket,
+        source_app: event.source_app,
+        session_id: event.session_id,
+        hook_event_type: event.hook_event_type,
+        count: 1
+      });
+    }
+  }
+}
+
+// Fold staged increments into the rings; returns the delta to publish, if any
+export function flushMetrics(): MetricsDelta | null {
+  if (pending.size === 0) return null;
+
+  const deltas = Array.from(pending.values());
+  pending = new Map();
+  for (const row of deltas) {
+    addRow(row);
+  }
+  seq++;
+  return { seq, deltas };
+}
+
+export function startMetricsPush(publish: (delta: MetricsDelta) => void): void {
+  setInterval(() => {
+    const delta = flushMetrics();
+    if (delta) publish(delta);
+  }, PUSH_INTERVAL_MS);
+}
+
+function emptyPoint(timestamp: number): TimeseriesPoint {
+  return { timestamp, count: 0, eventTypes: {}, sessions: {}, sourceApps: {} };
+}
+
+function toPoint(bucket: Bucket, query: TimeseriesQuery): TimeseriesPoint {
+  if (!query.source_app && !query.session_id && !query.hook_event_type) {
+    return {
+      timestamp: bucket.start,
+      count: bucket.count,
+      eventTypes: { ...bucket.eventTypes },
+      sessions: { ...bucket.sessions },
+      sourceApps: { ...bucket.sourceApps }
+    };
+  }
+
+  const point = emptyPoint(bucket.start);
+  bucket.agents.forEach(agent => {
+    if (query.source_app && agent.source_app !== query.source_app) return;
+    if (query.session_id && !agent.session_id.startsWith(query.session_id)) return;
+
+    const types = query.hook_event_type
+      ? { [query.hook_event_type]: agent.eventTypes[query.hook_event_type] || 0 }
+      : agent.eventTypes;
+    for (const [type, count] of Object.entries(types)) {
+      if (count === 0) continue;
+      point.count += count;
+      increment(point.eventTypes, type, count);
+      increment(point.sessions, agent.session_id, count);
+      increment(point.sourceApps, agent.source_app, count);
+    }
+  });
+  return point;
+}
+
+// The last `points` buckets at `resolution`, oldest first, with empty buckets filled in
+export function getTimeseries(query: TimeseriesQuery): TimeseriesResult {
+  const ring = rings.find(r => r.resolution === query.resolution);
+  if (!ring) {
+    throw new Error(`Unsupported resolution: ${query.resolution} (expected one of ${METRICS_RESOLUTIONS.join(', ')})`);
+  }
+
+  const points = Math.max(1, Math.min(query.points || 60, BUCKETS_PER_RESOLUTION));
+  const lastSlot = Math.floor(Date.now() / ring.resolution);
+  const series: TimeseriesPoint[] = [];
+
+  for (let slot = lastSlot - points + 1; slot <= lastSlot; slot++) {
+    const start = slot * ring.resolution;
+    const bucket = ring.buckets[slot % BUCKETS_PER_RESOLUTION];
+    series.push(bucket && bucket.start === start ? toPoint(bucket, query) : emptyPoint(start));
+  }
+
+  return { seq, resolution: ring.resolution, points: series };
+}
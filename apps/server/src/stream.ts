@@ -0,0 +1,257 @@
+import type { ServerWebSocket } from 'bun';
+import type { HookEvent, MetricsDelta, StreamClientStats, StreamSubscription } from './types';
+
+// Per-client fan-out for /stream. Each client can subscribe to a subset of
+// source_app / session_id / hook_event_type values and choose a summary-only
+// projection. Messages for a client that isn't keeping up are held in a bounded
+// queue (coalesced by event id, oldest dropped first) and flushed on drain.
+const MAX_BUFFERED_BYTES = parseInt(process.env.STREAM_MAX_BUFFERED_BYTES || String(1024 * 1024));
+const MAX_QUEUED_MESSAGES = parseInt(process.env.STREAM_MAX_QUEUED_MESSAGES || '500');
+// How long a new client has to subscribe before it gets history under the default subscription
+const SUBSCRIBE_GRACE_MS = 250;
+
+interface StreamClient {
+  id: number;
+  subscription: StreamSubscription;
+  queue: Map<string, string>; // coalescing key -> serialized message
+  dropped: number; // total since connect
+  unreportedDrops: number; // dropped since the last lag message
+  sent: number;
+  historyTimer: ReturnType<typeof setTimeout> | null; // pending history for a client that hasn't subscribed yet
+}
+
+type StreamSocket = ServerWebSocket<unknown>;
+
+const clients = new Map<StreamSocket, StreamClient>();
+let nextClientId = 1;
+
+const defaultSubscription: StreamSubscription = { projection: 'full' };
+
+let loadHistory: () => HookEvent[] = () => [];
+
+// Source of the recent events sent as `initial` (set once at startup)
+export function setStreamHistory(loader: () => HookEvent[]): void {
+  loadHistory = loader;
+}
+
+// History is sent once the client's subscription is known: right after its first
+// subscribe message, or under the default subscription if none arrives in time
+export function addStreamClient(ws: StreamSocket): void {
+  const client: StreamClient = {
+    id: nextClientId++,
+    subscription: defaultSubscription,
+    queue: new Map(),
+    dropped: 0,
+    unreportedDrops: 0,
+    sent: 0,
+    historyTimer: null
+  };
+  client.historyTimer = setTimeout(() => {
+    client.historyTimer = null;
+    if (clients.get(ws) === client) sendHistory(ws, client);
+  }, SUBSCRIBE_GRACE_MS);
+  clients.set(ws, client);
+}
+
+export function removeStreamClient(ws: StreamSocket): void {
+  const client = clients.get(ws);
+  if (client?.historyTimer) clearTimeout(client.historyTimer);
+  clients.delete(ws);
+}
+
+function matchesList(value: string, allowed?: string[]): boolean {
+  return !allowed || allowed.length === 0 || allowed.includes(value);
+}
+
+export function matchesSubscription(event: HookEvent, subscription: StreamSubscription): boolean {
+  return matchesList(event.source_app, subscription.source_apps)
+    && matchesList(event.session_id, subscription.session_ids)
+    && matchesList(event.hook_event_type, subscription.hook_event_types);
+}
+
+// Summary projection: everything needed for the timeline header, without payload bodies or chat
+export function projectEvent(event: HookEvent, projection: StreamSubscription['projection']): HookEvent {
+  if (projection !== 'summary') return event;
+
+  const { payload, chat, ...rest } = event;
+  return {
+    ...rest,
+    payload: payload?.tool_name ? { tool_name: payload.tool_name } : {}
+  };
+}
+
+function recordDrop(client: StreamClient): void {
+  client.dropped++;
+  client.unreportedDrops++;
+}
+
+function sendOrQueue(ws: StreamSocket, client: StreamClient, key: string, message: string): void {
+  // Preserve ordering: once something is queued, everything else waits behind it
+  if (client.queue.size === 0 && ws.getBufferedAmount() < MAX_BUFFERED_BYTES) {
+    // -1 means Bun buffered it under backpressure; the buffered amount check above caps that
+    const status = ws.send(message);
+    if (status === 0) {
+      recordDrop(client);
+    } else {
+      client.sent++;
+    }
+    return;
+  }
+
+  if (client.queue.has(key)) {
+    // Coalesce: a newer version of the same event replaces the queued one in place
+    client.queue.set(key, message);
+    return;
+  }
+
+  client.queue.set(key, message);
+  while (client.queue.size > MAX_QUEUED_MESSAGES) {
+    const oldest = client.queue.keys().next().value as string;
+    client.queue.delete(oldest);
+    recordDrop(client);
+  }
+}
+
+// Recent events matching the client's subscription, through the same projection and queue as live events
+function sendHistory(ws: StreamSocket, client: StreamClient): void {
+  const events = loadHistory()
+    .filter(event => matchesSubscription(event, client.subscription))
+    .map(event => projectEvent(event, client.subscription.projection));
+  try {
+    sendOrQueue(ws, client, 'initial', JSON.stringify({ type: 'initial', data: events }));
+  } catch (err) {
+    clients.delete(ws);
+  }
+}
+
+// Serialize each event at most once per projection, regardless of client count
+export function broadcastEvents(events: HookEvent[]): void {
+  if (clients.size === 0) return;
+
+  for (const event of events) {
+    const serialized: Partial<Record<StreamSubscription['projection'], string>> = {};
+    const key = event.id !== undefined ? `event:${event.id}` : `event:${event.session_id}:${event.timestamp}`;
+
+    clients.forEach((client, ws) => {
+      if (!matchesSubscription(event, client.subscription)) return;
+
+      const projection = client.subscription.projection;
+      let message = serialized[projection];
+      if (message === undefined) {
+        message = JSON.stringify({ type: 'event', data: projectEvent(event, projection) });
+        serialized[projection] = message;
+      }
+
+      try {
+        sendOrQueue(ws, client, key, message);
+      } catch (err) {
+        // Client disconnected, remove from set
+        clients.delete(ws);
+      }
+    });
+  }
+}
+
+export function broadcastEvent(event: HookEvent): void {
+  broadcastEvents([event]);
+}
+
+// Metrics deltas are global (not filtered by subscription) and only go to clients that opted in
+export function broadcastMetrics(delta: MetricsDelta): void {
+  if (clients.size === 0) return;
+
+  const message = JSON.stringify({ type: 'metrics', data: delta });
+  clients.forEach((client, ws) => {
+    if (!client.subscription.metrics) return;
+    try {
+      sendOrQueue(ws, client, `metrics:${delta.seq}`, message);
+    } catch (err) {
+      clients.delete(ws);
+    }
+  });
+}
+
+// Called from the websocket drain handler once Bun's send buffer has room again
+export function drainStreamClient(ws: StreamSocket): void {
+  const client = clients.get(ws);
+  if (!client) return;
+
+  for (const [key, message] of client.queue) {
+    if (ws.getBufferedAmount() >= MAX_BUFFERED_BYTES) break;
+
+    client.queue.delete(key);
+    const status = ws.send(message);
+    if (status === 0) {
+      recordDrop(client);
+    } else {
+      client.sent++;
+    }
+    if (status === -1) break;
+  }
+
+  // Let the client know it missed events so it can refetch if it cares
+  if (client.unreportedDrops > 0) {
+    const status = ws.send(JSON.stringify({
+      type: 'lag',
+      data: { dropped: client.unreportedDrops, queued: client.queue.size }
+    }));
+    if (status !== 0) {
+      client.unreportedDrops = 0;
+    }
+  }
+}
+
+// Handle a client control message; a subscribe is answered with `subscribed` and matching history
+export function handleStreamMessage(ws: StreamSocket, raw: string | Buffer): void {
+  const client = clients.get(ws);
+  if (!client) return;
+
+  let message: any;
+  try {
+    message = JSON.parse(typeof raw === 'string' ? raw : raw.toString());
+  } catch {
+    ws.send(JSON.stringify({ type: 'error', data: { error: 'Invalid message' } }));
+    return;
+  }
+
+  if (message?.type === 'subscribe') {
+    const filters = message.data || {};
+    const asList = (value: unknown): string[] | undefined =>
+      Array.isArray(value) ? value.filter((v): v is string => typeof v === 'string') : undefined;
+
+    client.subscription = {
+      source_apps: asList(filters.source_apps),
+      session_ids: asList(filters.session_ids),
+      hook_event_types: asList(filters.hook_event_types),
+      projection: filters.projection === 'summary' ? 'summary' : 'full',
+      metrics: filters.metrics === true
+    };
+    // Anything queued was selected under the old subscription
+    client.queue.clear();
+    ws.send(JSON.stringify({ type: 'subscribed', data: client.subscription }));
+
+    if (client.historyTimer) {
+      clearTimeout(client.historyTimer);
+      client.historyTimer = null;
+    }
+    sendHistory(ws, client);
+    return;
+  }
+
+  ws.send(JSON.stringify({ type: 'error', data: { error: `Unknown message type: ${message?.type}` } }));
+}
+
+export function getStreamStats(): StreamClientStats[] {
+  const stats: StreamClientStats[] = [];
+  clients.forEach((client, ws) => {
+    stats.push({
+      id: client.id,
+      subscription: client.subscription,
+      queued: client.queue.size,
+      dropped: client.dropped,
+      sent: client.sent,
+      bufferedAmount: ws.getBufferedAmount()
+    });
+  });
+  return stats;
+}
@@ -23,6 +23,7 @@ export interface HumanInTheLoopStatus {
   status: 'pending' | 'responded' | 'timeout' | 'error';
   respondedAt?: number;
   response?: HumanInTheLoopResponse;
+  error?: string; // Why delivery to the agent failed (status 'error')
 }
 
 export interface HookEvent {
@@ -32,6 +33,9 @@ export interface HookEvent {
   hook_event_type: string;
   payload: Record<string, any>;
   chat?: any[];
+  chat_delta?: any[]; // Transcript messages appended since the session's previous event
+  chat_offset?: number; // Index of the first chat_delta message in the full transcript
+  chat_message_count?: number; // Transcript length when the event was recorded
   summary?: string;
   timestamp?: number;
   model_name?: string;
@@ -47,6 +51,155 @@ export interface FilterOptions {
   hook_event_types: string[];
 }
 
+// Position in the (timestamp, id) order of /events/query. Sent to clients as "timestamp:id",
+// so a cursor stays valid after its event has been deleted by retention.
+export interface EventCursor {
+  timestamp: number;
+  id: number;
+}
+
+// GET /events/query parameters (keyset pagination by (timestamp, id) cursor)
+export interface EventQuery {
+  source_apps?: string[];
+  session_ids?: string[];
+  hook_event_types?: string[];
+  model_names?: string[];
+  since?: number; // timestamp (ms), inclusive
+  until?: number; // timestamp (ms), inclusive
+  before?: EventCursor; // return events older than this position
+  after?: EventCursor; // return events newer than this position
+  limit?: number;
+  includePayload?: boolean;
+  includeChat?: boolean;
+}
+
+// Events from /events/query only carry payload/chat when explicitly requested
+export type EventSummary = Omit<HookEvent, 'payload' | 'chat'> & Partial<Pick<HookEvent, 'payload' | 'chat'>>;
+
+export interface EventQueryResult {
+  events: EventSummary[]; // oldest first
+  has_more: boolean; // more events exist beyond this page in the paging direction
+  before?: string; // cursor for the previous (older) page
+  after?: string; // cursor for the next (newer) page
+}
+
+// GET /events/search parameters (ranked full-text search, offset pagination)
+export interface EventSearchQuery {
+  q: string;
+  source_apps?: string[];
+  session_ids?: string[];
+  hook_event_types?: string[];
+  limit?: number;
+  offset?: number;
+  markStart?: string; // snippet highlight markers, inserted as-is around HTML-escaped text
+  markEnd?: string;
+}
+
+export interface EventSearchResult {
+  results: {
+    event: EventSummary;
+    snippet: string;
+    rank: number; // bm25 score, lower is better
+  }[];
+  has_more: boolean;
+}
+
+// Retention rule: events matching source_app and/or hook_event_type are kept for `days`.
+// The most specific matching rule wins (both fields > one field > default).
+export interface RetentionRule {
+  source_app?: string;
+  hook_event_type?: string;
+  days: number;
+}
+
+export interface DatabaseStats {
+  sizeBytes: number;
+  freeBytes: number;
+  pageSize: number;
+  incrementalVacuum: boolean;
+  events: number;
+  compressedEvents: number;
+  minuteRollups: number;
+  hourRollups: number;
+  chatSegments: number;
+}
+
+export interface MaintenanceReport {
+  startedAt: number;
+  durationMs: number;
+  expiredEvents: number;
+  compressedEvents: number;
+  compressedBytesSaved: number;
+  compactedRollups: number;
+  reclaimedBytes: number;
+  error?: string;
+}
+
+export interface EventCountRow {
+  bucket: number;
+  source_app: string;
+  session_id: string;
+  hook_event_type: string;
+  count: number;
+}
+
+// One bar of the pulse chart; mirrors the client's ChartDataPoint
+export interface TimeseriesPoint {
+  timestamp: number;
+  count: number;
+  eventTypes: Record<string, number>;
+  sessions: Record<string, number>;
+  sourceApps: Record<string, number>;
+}
+
+export interface TimeseriesQuery {
+  resolution: number; // bucket width in ms (1000, 3000, 5000 or 10000)
+  points: number;
+  source_app?: string;
+  session_id?: string; // exact id or prefix (agent ids use the first 8 chars)
+  hook_event_type?: string;
+}
+
+export interface TimeseriesResult {
+  seq: number; // apply only metrics deltas with a higher seq
+  resolution: number;
+  points: TimeseriesPoint[];
+}
+
+// Increments pushed on /stream since the previous metrics message, in 1s buckets
+export interface MetricsDelta {
+  seq: number;
+  deltas: EventCountRow[];
+}
+
+// Per-client /stream subscription (empty or missing lists mean "all")
+export interface StreamSubscription {
+  source_apps?: string[];
+  session_ids?: string[];
+  hook_event_types?: string[];
+  projection: 'full' | 'summary';
+  metrics?: boolean; // also receive periodic `metrics` delta messages
+}
+
+export interface HITLStats {
+  delivered: number;
+  retried: number;
+  failed: number;
+  expired: number;
+  pendingRequests: number; // awaiting a human answer (armed timeouts)
+  queuedDeliveries: number; // answers not yet confirmed by the agent
+  connections: number;
+}
+
+export interface StreamClientStats {
+  id: number;
+  subscription: StreamSubscription;
+  queued: number;
+  dropped: number;
+  sent: number;
+  bufferedAmount: number;
+}
+
 // Theme-related interfaces for server-side storage and API
 export interface ThemeColors {
   primary: string;